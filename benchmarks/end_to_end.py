@@ -0,0 +1,284 @@
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import util.helpers as helpers
+
+from . import fake_openai
+
+
+Path = pathlib.Path
+
+ROOT: Path = Path(__file__).resolve().parent.parent
+
+
+class Step:
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.wall_time: float = 0.0
+        self.peak_rss_kb: int = 0
+        self.runs: int = 0
+
+    def run(self, command: list[str]) -> None:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, *command],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        self.wall_time += time.perf_counter() - start
+        self.peak_rss_kb = max(self.peak_rss_kb, usage.ru_maxrss)
+        self.runs += 1
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"{self.name}: {' '.join(command)} exited with"
+                f" {process.returncode}"
+            )
+
+    def to_json(self) -> dict:
+        return {
+            "wall_time": self.wall_time,
+            "peak_rss_mb": self.peak_rss_kb / 1024,
+            "runs": self.runs,
+        }
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def count_phrases(snapshots_dir: Path, platforms: list[str]) -> int:
+    return sum(
+        len(json.loads(open(snapshots_dir / f"{platform}.json", "rb").read()))
+        for platform in platforms
+    )
+
+
+def read_batch_latencies(trace_filename: Path) -> list[float]:
+    if not trace_filename.exists():
+        return []
+    spans = [
+        json.loads(line) for line in open(trace_filename, encoding="utf-8")
+    ]
+    return [span["duration"] for span in spans if span["kind"] == "batch"]
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    return {
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=Path, default=ROOT / "data")
+    parser.add_argument(
+        "--platform",
+        type=str,
+        nargs="+",
+        choices=helpers.PLATFORMS,
+        default=list(helpers.PLATFORMS),
+    )
+    parser.add_argument(
+        "--canonical_languague_code", type=str, default="bashkort-alifba"
+    )
+    parser.add_argument("--iso_language_code", type=str, default="ba")
+    parser.add_argument(
+        "--results_dir", type=Path, default=ROOT / "benchmarks" / "results"
+    )
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument(
+        "--translation_args",
+        type=str,
+        nargs=argparse.REMAINDER,
+        default=[],
+    )
+    fake_openai.add_arguments(parser)
+    parser.set_defaults(latency=0.2)
+    args = parser.parse_args()
+
+    fake_openai.configure(args)
+    server = fake_openai.start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    workdir = Path(tempfile.mkdtemp(prefix="translate-bench-"))
+    snapshots_dir = workdir / "snapshots"
+    language_dir = snapshots_dir / "bench"
+    language_dir.mkdir(parents=True)
+    for platform in args.platform:
+        (language_dir / f"{platform}.json").write_text("{}")
+    cache_args = ["--phrase_cache_dir", str(workdir / "phrase_cache")]
+    trace_filename = workdir / "trace.jsonl"
+
+    steps = {
+        name: Step(name)
+        for name in (
+            "create_initial_snapshot",
+            "make_basic_translation",
+            "merge_and_prepare_candidate",
+        )
+    }
+    try:
+        for platform in args.platform:
+            steps["create_initial_snapshot"].run(
+                [
+                    "create_initial_snapshot.py",
+                    "--default_data_dir",
+                    str(args.data_dir / "default"),
+                    "--default_languague_code",
+                    "ru",
+                    "--canonical_data_dir",
+                    str(args.data_dir / "canonical"),
+                    "--canonical_languague_code",
+                    args.canonical_languague_code,
+                    "--platform",
+                    platform,
+                    "--snapshots_dir",
+                    str(snapshots_dir),
+                    "--telegram_language_code",
+                    "bench",
+                    *cache_args,
+                ]
+            )
+
+        phrases_before = count_phrases(language_dir, args.platform)
+        steps["make_basic_translation"].run(
+            [
+                "make_basic_translation.py",
+                "--defaults_dir",
+                str(args.data_dir / "default"),
+                "--platform",
+                *args.platform,
+                "--telegram_language_code",
+                "bench",
+                "--iso_language_code",
+                args.iso_language_code,
+                "--snapshots_dir",
+                str(snapshots_dir),
+                "--prompt_template_filename",
+                str(ROOT / "util" / "prompt.template"),
+                "--openai_api_key",
+                "bench",
+                "--openai_base_url",
+                base_url,
+                "--no_llm_cache",
+                *cache_args,
+                *args.translation_args,
+                "--trace_filename",
+                str(trace_filename),
+            ]
+        )
+        phrases_after = count_phrases(language_dir, args.platform)
+        # Measured by the client, so scheduler waits and retries are included.
+        batch_latencies = read_batch_latencies(trace_filename)
+
+        steps["merge_and_prepare_candidate"].run(
+            [
+                "merge_and_prepare_candidate.py",
+                "--defaults_dir",
+                str(args.data_dir / "default"),
+                "--default_languague_code",
+                "ru",
+                "--canonical_data_dir",
+                str(args.data_dir / "canonical"),
+                "--canonical_languague_code",
+                args.canonical_languague_code,
+                "--platform",
+                *args.platform,
+                "--snapshots_dir",
+                str(snapshots_dir),
+                "--telegram_language_code",
+                "bench",
+                "--output_dir",
+                str(workdir / "output"),
+                *cache_args,
+            ]
+        )
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    translation_time = steps["make_basic_translation"].wall_time
+    latencies = fake_openai.Handler.latencies
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platforms": args.platform,
+        "server": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "rate_limit_rate": args.rate_limit_rate,
+            "server_error_rate": args.server_error_rate,
+            "drop_answer_rate": args.drop_answer_rate,
+            "broken_answer_rate": args.broken_answer_rate,
+        },
+        "translation_args": args.translation_args,
+        "steps": {name: step.to_json() for name, step in steps.items()},
+        "requests": len(latencies),
+        "statuses": {
+            str(status): count
+            for status, count in sorted(fake_openai.Handler.statuses.items())
+        },
+        "phrases": phrases_after - phrases_before,
+        "requests_per_second": len(latencies) / translation_time,
+        "phrases_per_second": (phrases_after - phrases_before)
+        / translation_time,
+        "batch_latency": latency_summary(batch_latencies),
+        "server_latency": latency_summary(latencies),
+    }
+
+    for name, step in results["steps"].items():
+        print(
+            f"{name:<28} {step['wall_time']:>8.2f}s"
+            f" {step['peak_rss_mb']:>8.1f} MB peak RSS"
+        )
+    print(
+        f"requests: {results['requests']} {results['statuses']},"
+        f" {results['requests_per_second']:.1f} req/s;"
+        f" phrases: {results['phrases']},"
+        f" {results['phrases_per_second']:.1f} phrases/s"
+    )
+    for field in ("batch_latency", "server_latency"):
+        print(
+            f"{field.replace('_', ' ')}:"
+            + "".join(
+                f" {name} {value * 1000:.0f}ms"
+                for name, value in results[field].items()
+            )
+        )
+
+    if args.baseline is not None:
+        baseline = json.loads(open(args.baseline, "rb").read())
+        for name, step in results["steps"].items():
+            before = baseline["steps"][name]["wall_time"]
+            print(
+                f"{name:<28} {before:>8.2f}s -> {step['wall_time']:.2f}s"
+                f" ({step['wall_time'] / before - 1:+.1%})"
+            )
+
+    args.results_dir.mkdir(parents=True, exist_ok=True)
+    results_filename = (
+        args.results_dir
+        / f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    open(results_filename, "w").write(json.dumps(results, indent=2) + "\n")
+    print(f"Saved {results_filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import http.server
+import json
+import random
+import re
+import threading
+import time
+
+
+EXAMPLE = re.compile(r'^(\d+)\.\n"""(.*?)"""\n"""(.*?)"""$', re.M | re.DOTALL)
+EXAMPLE_COUNT = re.compile(r"There are (\d+) text strings")
+LANGUAGE_LABEL = re.compile(r'^1\. ([^\n:"]+): """\.\.\."""$', re.M)
+STREAM_CHUNK_SIZE = 64
+# Stripped from an answer to imitate a translation losing its placeholders.
+BREAKABLE = re.compile(r"%(?:\d+\$)?[sd@]|\{\w+\}|\*\*|</?b>")
+
+
+def make_answer(
+    prompt: str, drop_answer_rate: float = 0.0, broken_answer_rate: float = 0.0
+) -> str:
+    example_count = int(EXAMPLE_COUNT.search(prompt).group(1))
+    examples = EXAMPLE.findall(prompt)[-example_count:]
+    labels = [f"{label}: " for label in LANGUAGE_LABEL.findall(prompt)]
+    return "\n".join(
+        f'{number}. {label}"""'
+        + (
+            BREAKABLE.sub("", text_ru)
+            if random.random() < broken_answer_rate
+            else text_ru
+        )
+        + '"""'
+        for number, _, text_ru in examples
+        for label in labels or [""]
+        if random.random() >= drop_answer_rate
+    )
+
+
+def make_completion(
+    prompt: str, drop_answer_rate: float = 0.0, broken_answer_rate: float = 0.0
+) -> dict:
+    answer = make_answer(prompt, drop_answer_rate, broken_answer_rate)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(answer) // 4,
+            "total_tokens": (len(prompt) + len(answer)) // 4,
+        },
+    }
+
+
+class Server(http.server.ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency: float = 0.0
+    rate_limit_rate: float = 0.0
+    server_error_rate: float = 0.0
+    max_in_flight: int | None = None
+    retry_after: float = 1.0
+    drop_answer_rate: float = 0.0
+    broken_answer_rate: float = 0.0
+    jitter: float = 0.0
+    in_flight: int = 0
+    lock: threading.Lock = threading.Lock()
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_response(self, code, message=None):
+        with self.lock:
+            Handler.statuses[code] = Handler.statuses.get(code, 0) + 1
+        super().send_response(code, message)
+
+    def send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii"))
+        self.wfile.write(data + b"\r\n")
+        self.wfile.flush()
+
+    def send_stream(self, completion: dict, duration: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        content = completion["choices"][0]["message"]["content"]
+        pieces = [
+            content[i : i + STREAM_CHUNK_SIZE]
+            for i in range(0, len(content), STREAM_CHUNK_SIZE)
+        ]
+        events = [
+            {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            for piece in pieces
+        ]
+        events.append(
+            {
+                "choices": [
+                    {"index": 0, "delta": {}, "finish_reason": "stop"}
+                ],
+                "usage": completion["usage"],
+            }
+        )
+        for event in events:
+            time.sleep(duration / len(events))
+            self.send_chunk(
+                b"data: "
+                + json.dumps(event, ensure_ascii=False).encode("utf-8")
+                + b"\n\n"
+            )
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+        prompt = request["messages"][0]["content"][0]["text"]
+
+        start = time.perf_counter()
+        with self.lock:
+            Handler.in_flight += 1
+            overloaded = (
+                self.max_in_flight is not None
+                and Handler.in_flight > self.max_in_flight
+            )
+        try:
+            roll = random.random()
+            if overloaded or roll < self.rate_limit_rate:
+                self.send_response(429)
+                self.send_header("Retry-After", str(self.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            latency = max(
+                0.0, self.latency + random.uniform(-1, 1) * self.jitter
+            )
+            if request.get("stream"):
+                # Spend a tenth of the latency before the first token and
+                # the rest generating the answer.
+                time.sleep(latency / 10)
+            else:
+                time.sleep(latency)
+            if roll < self.rate_limit_rate + self.server_error_rate:
+                self.send_json(500, {"error": {"message": "Injected error"}})
+                return
+            completion = make_completion(
+                prompt, self.drop_answer_rate, self.broken_answer_rate
+            )
+            if request.get("stream"):
+                self.send_stream(completion, latency * 9 / 10)
+            else:
+                self.send_json(200, completion)
+        finally:
+            with self.lock:
+                Handler.in_flight -= 1
+                Handler.latencies.append(time.perf_counter() - start)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0)
+    parser.add_argument("--server_error_rate", type=float, default=0.0)
+    parser.add_argument("--max_in_flight", type=int, default=None)
+    parser.add_argument("--retry_after", type=float, default=1.0)
+    parser.add_argument("--drop_answer_rate", type=float, default=0.0)
+    parser.add_argument("--broken_answer_rate", type=float, default=0.0)
+
+
+def configure(args: argparse.Namespace) -> None:
+    Handler.latency = args.latency
+    Handler.jitter = args.jitter
+    Handler.rate_limit_rate = args.rate_limit_rate
+    Handler.server_error_rate = args.server_error_rate
+    Handler.max_in_flight = args.max_in_flight
+    Handler.retry_after = args.retry_after
+    Handler.drop_answer_rate = args.drop_answer_rate
+    Handler.broken_answer_rate = args.broken_answer_rate
+
+
+def start(host: str = "127.0.0.1", port: int = 0) -> Server:
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    configure(args)
+    server = Server((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{server.server_port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import email.utils
+import gzip
+import hashlib
+import http.server
+import pathlib
+import re
+import threading
+import time
+
+import util.helpers as helpers
+
+
+Path = pathlib.Path
+
+EXPORT_PATH = re.compile(r"^/([\w-]+)/(\w+)/export$")
+
+
+class Server(http.server.ThreadingHTTPServer):
+    request_queue_size = 256
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    data_dir: Path = Path("data")
+    latency: float = 0.0
+    validators: bool = True
+    lock: threading.Lock = threading.Lock()
+    statuses: dict[int, int] = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_response(self, code, message=None):
+        with self.lock:
+            Handler.statuses[code] = Handler.statuses.get(code, 0) + 1
+        super().send_response(code, message)
+
+    def send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def find_dump(self) -> Path | None:
+        match = EXPORT_PATH.match(self.path)
+        if match is None or match.group(2) not in helpers.PLATFORMS:
+            return None
+        language_code, platform = match.groups()
+        for directory in ("default", "canonical"):
+            filename = helpers.phrases_filename(
+                self.data_dir / directory, language_code, platform
+            )
+            if filename.exists():
+                return filename
+        return None
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        filename = self.find_dump()
+        if filename is None:
+            self.send_empty(404)
+            return
+
+        data = open(filename, "rb").read()
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        mtime = int(filename.stat().st_mtime)
+        if self.validators:
+            if self.headers.get("If-None-Match") == etag:
+                self.send_empty(304)
+                return
+            since = self.headers.get("If-Modified-Since")
+            if (
+                since is not None
+                and "If-None-Match" not in self.headers
+                and email.utils.parsedate_to_datetime(since).timestamp()
+                >= mtime
+            ):
+                self.send_empty(304)
+                return
+
+        headers = {}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        if self.validators:
+            headers["ETag"] = etag
+            headers["Last-Modified"] = email.utils.formatdate(
+                mtime, usegmt=True
+            )
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--data_dir", type=Path, default=Path("data"))
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--no_validators", action="store_true")
+
+
+def configure(args: argparse.Namespace) -> None:
+    Handler.data_dir = args.data_dir
+    Handler.latency = args.latency
+    Handler.validators = not args.no_validators
+
+
+def start(host: str = "127.0.0.1", port: int = 0) -> Server:
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    configure(args)
+    server = Server((args.host, args.port), Handler)
+    print(f"Serving on http://{args.host}:{server.server_port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import pathlib
+import random
+import time
+
+import util.dictionaries as dictionaries
+import util.glossary as glossary
+import util.helpers as helpers
+
+
+Path = pathlib.Path
+
+
+def make_glossary(
+    tasks: list[helpers.Task], term_count: int, rng: random.Random
+) -> dictionaries.Dictionary:
+    words_en = sorted(
+        {word for task in tasks for word in task.text_en.lower().split()}
+    )
+    words_ru = sorted(
+        {word for task in tasks for word in task.text_ru.lower().split()}
+    )
+    snippets = []
+    for _ in range(term_count):
+        snippets.append(
+            dictionaries.Snippet(
+                " ".join(rng.sample(words_en, rng.choice((1, 1, 1, 2)))),
+                " ".join(rng.sample(words_ru, rng.choice((1, 1, 1, 2)))),
+                "",
+            )
+        )
+
+    return dictionaries.Dictionary(snippets=tuple(snippets))
+
+
+def match_naive(
+    dictionary: dictionaries.Dictionary, tasks: list[helpers.Task]
+) -> list[set[int]]:
+    result = []
+    for task in tasks:
+        found = set()
+        for snippet_id, snippet in enumerate(dictionary.snippets):
+            if (
+                task.text_en.lower().find(snippet.en) != -1
+                or task.text_ru.lower().find(snippet.ru) != -1
+            ):
+                found.add(snippet_id)
+        result.append(found)
+
+    return result
+
+
+def match_automaton(
+    dictionary: dictionaries.Dictionary, tasks: list[helpers.Task]
+) -> list[set[int]]:
+    matcher = glossary.get_matcher(dictionary)
+    return [matcher.match_ids(task.text_en, task.text_ru) for task in tasks]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--defaults_dir", type=Path, default=Path("data/default")
+    )
+    parser.add_argument("--platform", type=str, default="android")
+    parser.add_argument("--task_count", type=int, default=2000)
+    parser.add_argument(
+        "--term_counts", type=int, nargs="+", default=[40, 1000, 10000]
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tasks = helpers.load_tasks(args.defaults_dir, args.platform)
+    tasks = rng.sample(tasks, min(args.task_count, len(tasks)))
+
+    print(
+        f"{'terms':>6} {'build ms':>9} {'naive ms':>9}"
+        f" {'automaton ms':>13} {'speedup':>8}"
+    )
+    for term_count in args.term_counts:
+        dictionary = make_glossary(tasks, term_count, rng)
+
+        start = time.perf_counter()
+        glossary.get_matcher(dictionary)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = match_naive(dictionary, tasks)
+        naive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = match_automaton(dictionary, tasks)
+        automaton_time = time.perf_counter() - start
+
+        assert actual == expected
+        print(
+            f"{term_count:>6} {build_time * 1000:>9.1f}"
+            f" {naive_time * 1000:>9.1f} {automaton_time * 1000:>13.1f}"
+            f" {naive_time / automaton_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import pathlib
+import time
+
+import util.helpers as helpers
+import util.memory as memory
+
+
+Path = pathlib.Path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--defaults_dir", type=Path, default=Path("data/default")
+    )
+    parser.add_argument(
+        "--snapshots_dir", type=Path, default=Path("data/snapshots")
+    )
+    parser.add_argument(
+        "--telegram_language_code", type=str, default="bashkir-ex-ru"
+    )
+    parser.add_argument(
+        "--canonical_data_dir", type=Path, default=Path("data/canonical")
+    )
+    parser.add_argument(
+        "--canonical_languague_code", type=str, default="bashkort-alifba"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    translation_memory = memory.build_memory(
+        args.defaults_dir,
+        args.snapshots_dir,
+        args.telegram_language_code,
+        args.canonical_data_dir,
+        args.canonical_languague_code,
+    )
+    build_time = time.perf_counter() - start
+
+    tasks = [
+        task
+        for platform in helpers.PLATFORMS
+        for task in helpers.load_tasks(args.defaults_dir, platform)
+    ]
+
+    start = time.perf_counter()
+    hits = sum(translation_memory.lookup(task) is not None for task in tasks)
+    lookup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fuzzy_hits = sum(bool(translation_memory.search(task)) for task in tasks)
+    search_time = time.perf_counter() - start
+
+    print(
+        f"{len(translation_memory)} entries built in {build_time:.2f}s,"
+        f" {len(tasks)} tasks"
+    )
+    print(
+        f"exact lookup: {lookup_time / len(tasks) * 1e6:.1f}us per task,"
+        f" {hits} hits"
+    )
+    print(
+        f"fuzzy search: {search_time / len(tasks) * 1e6:.1f}us per task,"
+        f" {fuzzy_hits} tasks with examples"
+    )
+
+
+if __name__ == "__main__":
+    main()
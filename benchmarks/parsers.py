@@ -0,0 +1,128 @@
+import argparse
+import pathlib
+import re
+import statistics
+import sys
+import time
+import typing
+
+import util.helpers as helpers
+
+
+Path = pathlib.Path
+
+
+def parse_xml_bs4(filename: Path) -> list[helpers.Phrase]:
+    import bs4
+
+    data = open(filename, "rb").read().decode("utf-8")
+    soup = bs4.BeautifulSoup(data, features="xml")
+    res = []
+    keys = set()
+    for entry in soup.select("resources > string"):
+        name = entry.attrs["name"]
+        text = entry.text
+        if name in keys:
+            continue
+        keys.add(name)
+        res.append(helpers.Phrase(name, text))
+
+    return res
+
+
+def parse_strings_regex(filename: Path) -> list[helpers.Phrase]:
+    lines = open(filename, "rb").read().decode("utf-8").splitlines()
+    res = {}
+    for line in lines:
+        m = re.search(r'^\s*"([^"]+)"\s*=\s*"(.+)"', line)
+        if not m:
+            continue
+        name = m.group(1)
+        text = m.group(2)
+        if res.get(name, text) != text:
+            continue
+        res[name] = text
+
+    return [helpers.Phrase(name, text) for name, text in res.items()]
+
+
+def measure(
+    parse: typing.Callable[[Path], list[helpers.Phrase]],
+    filename: Path,
+    repeat: int,
+) -> tuple[float, list[helpers.Phrase]]:
+    timings = []
+    phrases = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        phrases = parse(filename)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), phrases
+
+
+def count_mismatches(
+    baseline: list[helpers.Phrase], streaming: list[helpers.Phrase]
+) -> int:
+    baseline_texts = dict(baseline)
+    streaming_texts = dict(streaming)
+    return sum(
+        baseline_texts.get(name) != streaming_texts.get(name)
+        for name in baseline_texts.keys() | streaming_texts.keys()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=Path, default=Path("data"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    filenames = sorted(
+        filename
+        for filename in args.data_dir.glob("*/*/*")
+        if filename.suffix in (".xml", ".strings")
+        and filename.stat().st_size > 0
+    )
+
+    print(
+        f"{'file':<48} {'entries':>8} {'baseline ms':>12}"
+        f" {'streaming ms':>13} {'speedup':>8} {'mismatches':>11}"
+    )
+    total_baseline = 0.0
+    total_streaming = 0.0
+    total_mismatches = 0
+    for filename in filenames:
+        if filename.suffix == ".xml":
+            baseline, streaming = parse_xml_bs4, helpers.parse_xml
+        else:
+            baseline, streaming = parse_strings_regex, helpers.parse_strings
+        baseline_time, baseline_phrases = measure(
+            baseline, filename, args.repeat
+        )
+        streaming_time, streaming_phrases = measure(
+            streaming, filename, args.repeat
+        )
+        mismatches = count_mismatches(baseline_phrases, streaming_phrases)
+        total_baseline += baseline_time
+        total_streaming += streaming_time
+        total_mismatches += mismatches
+        print(
+            f"{str(filename.relative_to(args.data_dir)):<48}"
+            f" {len(streaming_phrases):>8}"
+            f" {baseline_time * 1000:>12.1f} {streaming_time * 1000:>13.1f}"
+            f" {baseline_time / streaming_time:>7.1f}x {mismatches:>11}"
+        )
+
+    print(
+        f"{'total':<48} {'':>8} {total_baseline * 1000:>12.1f}"
+        f" {total_streaming * 1000:>13.1f}"
+        f" {total_baseline / total_streaming:>7.1f}x {total_mismatches:>11}"
+    )
+    # Both parsers have to agree on every entry of every dump.
+    if total_mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
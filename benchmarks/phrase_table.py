@@ -0,0 +1,206 @@
+import argparse
+import gc
+import pathlib
+import statistics
+import time
+import tracemalloc
+import typing
+
+import util.helpers as helpers
+import util.phrase_cache as phrase_cache
+import util.phrase_table as phrase_table
+
+
+Path = pathlib.Path
+
+DEFAULT_LANGUAGE_CODES = ("en", "ru")
+CANONICAL_LANGUAGE_CODES = ("bashkort-alifba", "tatar-cyrill")
+TELEGRAM_LANGUAGE_CODES = ("bashkir-ex-ru", "tatar-ex-ru")
+
+
+def language_dirs(args: argparse.Namespace) -> list[tuple[Path, str]]:
+    return [
+        (args.data_dir / "default", language_code)
+        for language_code in DEFAULT_LANGUAGE_CODES
+    ] + [
+        (args.data_dir / "canonical", language_code)
+        for language_code in CANONICAL_LANGUAGE_CODES
+    ]
+
+
+def load_lists(
+    args: argparse.Namespace, cache: phrase_cache.PhraseCache | None
+) -> dict[tuple[str, str], list[helpers.Phrase]]:
+    return {
+        (language_code, platform): helpers.load_phrases(
+            base_path, language_code, platform, cache
+        )
+        for platform in helpers.PLATFORMS
+        for base_path, language_code in language_dirs(args)
+    }
+
+
+def load_tables(
+    args: argparse.Namespace, cache: phrase_cache.PhraseCache | None
+) -> dict[str, phrase_table.PhraseTable]:
+    tables = {}
+    for platform in helpers.PLATFORMS:
+        table = tables[platform] = phrase_table.PhraseTable()
+        for base_path, language_code in language_dirs(args):
+            table.add(
+                language_code,
+                helpers.load_entries(
+                    base_path, language_code, platform, cache
+                ),
+                base=(
+                    "ru" if language_code in CANONICAL_LANGUAGE_CODES else None
+                ),
+            )
+    return tables
+
+
+def load_snapshots(args: argparse.Namespace) -> dict[tuple[str, str], dict]:
+    snapshots = {}
+    for platform in helpers.PLATFORMS:
+        for language_code in TELEGRAM_LANGUAGE_CODES:
+            filename = (
+                args.data_dir / "snapshots" / language_code / platform
+            ).with_suffix(".json")
+            if filename.exists():
+                snapshots[language_code, platform] = helpers.Snapshot(
+                    args.data_dir / "snapshots", language_code, platform
+                ).phrases
+    return snapshots
+
+
+def join_lists(
+    corpus: dict[tuple[str, str], list[helpers.Phrase]],
+    snapshots: dict[tuple[str, str], dict[str, str]],
+) -> int:
+    count = 0
+    for platform in helpers.PLATFORMS:
+        phrases_en = corpus["en", platform]
+        phrases_ru = corpus["ru", platform]
+        dict_ru = {phrase.name: phrase for phrase in phrases_ru}
+        tasks = [
+            helpers.Task(phrase.name, phrase.text, dict_ru[phrase.name].text)
+            for phrase in phrases_en
+            if phrase.name in dict_ru
+        ]
+        count += len(tasks)
+
+        for canonical_code, telegram_code in zip(
+            CANONICAL_LANGUAGE_CODES, TELEGRAM_LANGUAGE_CODES
+        ):
+            default_phrases = {phrase.name: phrase for phrase in phrases_ru}
+            translation = {}
+            for phrase in corpus[canonical_code, platform]:
+                default_phrase = default_phrases.get(phrase.name)
+                if default_phrase is None:
+                    continue
+                if phrase.text != default_phrase.text:
+                    translation[phrase.name] = phrase.text
+            for name, text in snapshots.get(
+                (telegram_code, platform), {}
+            ).items():
+                if name not in translation:
+                    translation[name] = text
+            count += len(sorted(translation.items()))
+    return count
+
+
+def join_tables(
+    corpus: dict[str, phrase_table.PhraseTable],
+    snapshots: dict[tuple[str, str], dict[str, str]],
+) -> int:
+    count = 0
+    for platform, table in corpus.items():
+        tasks = [helpers.Task(*row) for row in table.join("en", "ru")]
+        count += len(tasks)
+
+        for canonical_code, telegram_code in zip(
+            CANONICAL_LANGUAGE_CODES, TELEGRAM_LANGUAGE_CODES
+        ):
+            table.add(
+                "snapshot",
+                snapshots.get((telegram_code, platform), {}).items(),
+            )
+            count += len(table.overlay(canonical_code, "ru", "snapshot"))
+            table.remove("snapshot")
+    return count
+
+
+def measure(
+    args: argparse.Namespace,
+    load: typing.Callable[..., typing.Any],
+    join: typing.Callable[[typing.Any, dict], int],
+    snapshots: dict[tuple[str, str], dict],
+    cache: phrase_cache.PhraseCache | None,
+) -> dict[str, float]:
+    load_times = []
+    join_times = []
+    count = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        corpus = load(args, cache)
+        load_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        count = join(corpus, snapshots)
+        join_times.append(time.perf_counter() - start)
+        del corpus
+        gc.collect()
+
+    tracemalloc.start()
+    corpus = load(args, cache)
+    retained, _ = tracemalloc.get_traced_memory()
+    join(corpus, snapshots)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "load": statistics.median(load_times),
+        "join": statistics.median(join_times),
+        "retained": retained,
+        "peak": peak,
+        "rows": count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=Path, default=Path("data"))
+    parser.add_argument("--repeat", type=int, default=5)
+    phrase_cache.add_arguments(parser)
+    args = parser.parse_args()
+
+    cache = phrase_cache.from_args(args)
+    snapshots = load_snapshots(args)
+    # Warm up the phrase cache, so both structures load the same way.
+    load_lists(args, cache)
+    results = {
+        "lists": measure(args, load_lists, join_lists, snapshots, cache),
+        "tables": measure(args, load_tables, join_tables, snapshots, cache),
+    }
+    assert results["lists"]["rows"] == results["tables"]["rows"]
+
+    print(
+        f"{'structure':<10} {'load ms':>9} {'join ms':>9}"
+        f" {'retained MB':>12} {'peak MB':>9}"
+    )
+    for structure, result in results.items():
+        print(
+            f"{structure:<10} {result['load'] * 1000:>9.1f}"
+            f" {result['join'] * 1000:>9.1f}"
+            f" {result['retained'] / 2**20:>12.1f}"
+            f" {result['peak'] / 2**20:>9.1f}"
+        )
+    lists, tables = results["lists"], results["tables"]
+    print(
+        f"load {lists['load'] / tables['load']:.2f}x,"
+        f" join {lists['join'] / tables['join']:.2f}x faster,"
+        f" peak memory {lists['peak'] / tables['peak']:.2f}x lower"
+    )
+
+
+if __name__ == "__main__":
+    main()
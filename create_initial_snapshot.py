@@ -2,6 +2,8 @@ import argparse
 import pathlib
 
 import util.helpers as helpers
+import util.phrase_cache as phrase_cache
+import util.phrase_table as phrase_table
 
 
 Path = pathlib.Path
@@ -35,30 +37,41 @@ def main():
     parser.add_argument("--platform", type=str, required=True)
     parser.add_argument("--snapshots_dir", type=Path, required=True)
     parser.add_argument("--telegram_language_code", type=str, required=True)
+    phrase_cache.add_arguments(parser)
     args = parser.parse_args()
 
-    canonical_phrases: list[helpers.Phrase] = helpers.load_phrases(
-        args.canonical_data_dir, args.canonical_languague_code, args.platform
+    cache = phrase_cache.from_args(args)
+
+    table = phrase_table.PhraseTable()
+    table.add(
+        "default",
+        helpers.load_entries(
+            args.default_data_dir,
+            args.default_languague_code,
+            args.platform,
+            cache,
+        ),
     )
-    default_phrases: list[helpers.Phrase] = helpers.load_phrases(
-        args.default_data_dir, args.default_languague_code, args.platform
+    table.add(
+        "canonical",
+        helpers.load_entries(
+            args.canonical_data_dir,
+            args.canonical_languague_code,
+            args.platform,
+            cache,
+        ),
+        base="default",
     )
 
-    canonical_phrases = {phrase.name: phrase for phrase in canonical_phrases}
-    default_phrases = {phrase.name: phrase for phrase in default_phrases}
-
     snapshot = helpers.Snapshot(
         args.snapshots_dir, args.telegram_language_code, args.platform
     )
     assert len(snapshot.phrases) == 0, "Snapshot already exists"
 
-    for name, phrase in canonical_phrases.items():
-        default_phrase = default_phrases[name]
-        if phrase.text == default_phrase.text:
-            continue
-        snapshot.phrases[name] = phrase.text
+    for name, text in table.modified("canonical", "default"):
+        snapshot.update_phrase(helpers.Phrase(name, text))
 
-    snapshot.save()
+    snapshot.compact()
 
 
 if __name__ == "__main__":
@@ -1,144 +1,662 @@
 import argparse
-import concurrent.futures
+import asyncio
 import datetime
+import math
+import os
 import pathlib
-import re
-import typing
+import time
 
+import util.batching as batching
+import util.bulk as bulk
 import util.chatgpt as chatgpt
+import util.clustering as clustering
 import util.helpers as helpers
 import util.dictionaries as dictionaries
+import util.llm_cache as llm_cache
+import util.memory as memory
+import util.phrase_cache as phrase_cache
+import util.scheduler as scheduler
+import util.tracing as tracing
+import util.translation as translation
+import util.validation as validation
 
 
 Path = pathlib.Path
 
 
-class Batch(typing.NamedTuple):
-    tasks: list[helpers.Task]
-    prompt_template: str
-    language_name: str
-    dictionary: dictionaries.Dictionary
-
-
-def process_batch(
-    batch: Batch, chatgpt_client: chatgpt.ChatGpt
-) -> list[helpers.Phrase]:
-    example_strs = []
-    example_count = 0
-    used_snippets = set()
-    for id, task in enumerate(batch.tasks):
-        for snippet in batch.dictionary.snippets:
-            if (
-                task.text_en.lower().find(snippet.en) != -1
-                or task.text_ru.lower().find(snippet.ru) != -1
-            ):
-                used_snippets.add(snippet)
-        example_strs.append(f"{id+1}.")
-        example_strs.append(f'"""{task.text_en}"""')
-        example_strs.append(f'"""{task.text_ru}"""')
-        example_strs.append("")
-        example_count += 1
-    if not used_snippets:
-        used_snippets = batch.dictionary.snippets[:5]
-
-    footer = "\n".join(example_strs)
-    prompt = batch.prompt_template.format(
-        language_name=batch.language_name,
-        example_count=example_count,
-        snippets=helpers.format_snippets(used_snippets),
-        footer=footer,
-    )
-
-    resp = chatgpt_client.get_response(prompt)
-    answers = re.findall(r'\d+\.\s*"""(.*?)"""', resp, re.DOTALL)
-    if len(answers) != len(batch.tasks):
-        print(prompt)
-        print(resp)
-        raise ValueError("Invalid response")
-
-    result = []
-    for i in range(len(batch.tasks)):
-        result.append(helpers.Phrase(batch.tasks[i].name, answers[i]))
-
-    return result
+def apply_phrases(
+    phrases: list[helpers.Phrase],
+    targets: dict[str, list[tuple[str, str]]],
+    source_hashes: dict[str, str],
+    snapshots: dict[str, helpers.Snapshot],
+    derivations: dict[str, list[clustering.Derivation]] | None = None,
+    save: bool = True,
+) -> None:
+    if derivations:
+        phrases, failed = clustering.expand_phrases(phrases, derivations)
+        if failed:
+            print(
+                f"Could not derive {failed} translations,"
+                " they are left for the next run"
+            )
+    updated_platforms = set()
+    for phrase in phrases:
+        for platform, name in targets[phrase.name]:
+            snapshots[platform].update_phrase(
+                helpers.Phrase(name, phrase.text), source_hashes[phrase.name]
+            )
+            updated_platforms.add(platform)
+    if save:
+        for platform in updated_platforms:
+            snapshots[platform].save()
+
+
+def apply_answers(
+    answers: list[translation.Answer],
+    targets: dict[str, dict[str, list[tuple[str, str]]]],
+    source_hashes: dict[str, str],
+    snapshots: dict[str, dict[str, helpers.Snapshot]],
+    derivations: dict[str, list[clustering.Derivation]] | None = None,
+    save: bool = True,
+) -> None:
+    phrases_by_language: dict[str, list[helpers.Phrase]] = {}
+    for answer in answers:
+        for language_code, text in answer.texts.items():
+            phrases_by_language.setdefault(language_code, []).append(
+                helpers.Phrase(answer.name, text)
+            )
+    for language_code, phrases in phrases_by_language.items():
+        apply_phrases(
+            phrases,
+            targets[language_code],
+            source_hashes,
+            snapshots[language_code],
+            derivations,
+            save,
+        )
+
+
+def close_snapshots(snapshots: dict[str, dict[str, helpers.Snapshot]]) -> None:
+    for language_snapshots in snapshots.values():
+        for snapshot in language_snapshots.values():
+            snapshot.close()
+
+
+async def run_batches(
+    batches: list[translation.Batch],
+    chatgpt_client: chatgpt.AsyncChatGpt,
+    targets: dict[str, dict[str, list[tuple[str, str]]]],
+    source_hashes: dict[str, str],
+    snapshots: dict[str, dict[str, helpers.Snapshot]],
+    derivations: dict[str, list[clustering.Derivation]] | None = None,
+    stream: bool = False,
+    save_interval: float = 1.0,
+) -> None:
+    saved_at = time.monotonic()
+
+    def save_all() -> None:
+        nonlocal saved_at
+        for language_snapshots in snapshots.values():
+            for snapshot in language_snapshots.values():
+                snapshot.save()
+        saved_at = time.monotonic()
+
+    def commit(answers: list[translation.Answer]) -> None:
+        # Streamed answers are applied right away, but the journal is only
+        # fsynced every save_interval seconds.
+        apply_answers(
+            answers,
+            targets,
+            source_hashes,
+            snapshots,
+            derivations,
+            save=False,
+        )
+        if time.monotonic() - saved_at >= save_interval:
+            save_all()
+
+    try:
+        for future in asyncio.as_completed(
+            [
+                translation.translate_batch_async(
+                    batch, chatgpt_client, commit if stream else None
+                )
+                for batch in batches
+            ]
+        ):
+            try:
+                answers: list[translation.Answer] = await future
+            except Exception as ex:
+                print(f"Exception when processing a batch: {ex!r}")
+            else:
+                print(f"Done batch at {datetime.datetime.now()}")
+                if not stream:
+                    apply_answers(
+                        answers, targets, source_hashes, snapshots, derivations
+                    )
+            if stream:
+                save_all()
+    finally:
+        await chatgpt_client.close()
+
+
+def run_bulk_job(
+    job: bulk.Job,
+    backend: bulk.Backend,
+    snapshots: dict[str, helpers.Snapshot],
+    wait: bool,
+    poll_interval: float,
+) -> None:
+    job.submit(backend)
+    state = job.wait(backend, poll_interval) if wait else job.poll(backend)
+    if state == "submitted":
+        print(
+            f"Bulk job {job.job_id} is in progress,"
+            f" rerun with --bulk_job_id {job.job_id} to apply it"
+        )
+        return
+    if state != "finished":
+        print(f"Bulk job {job.job_id} is {state}")
+        return
+
+    phrases, missing = job.read_results()
+    apply_phrases(
+        phrases,
+        job.manifest["targets"],
+        job.manifest["source_hashes"],
+        snapshots,
+        job.derivations,
+    )
+    job.mark_ingested()
+    print(
+        f"Bulk job {job.job_id}: applied {len(phrases)} translations,"
+        f" {missing} tasks are left for the next run"
+    )
+
+
+def print_usage(tracer: tracing.Tracer, price_factor: float = 1.0) -> None:
+    prompt_tokens = tracer.total("batch", "prompt_tokens")
+    completion_tokens = tracer.total("batch", "completion_tokens")
+    cost = (
+        price_factor
+        * (
+            prompt_tokens * batching.PROMPT_TOKEN_PRICE
+            + completion_tokens * batching.COMPLETION_TOKEN_PRICE
+        )
+        / 1_000_000
+    )
+    print(tracer.summary())
+    print(
+        f"Usage: {prompt_tokens} prompt tokens,"
+        f" {completion_tokens} completion tokens, ${cost:.2f}"
+    )
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--defaults_dir", type=Path, required=True)
-    parser.add_argument("--platform", type=str, required=True)
-    parser.add_argument("--telegram_language_code", type=str, required=True)
-    parser.add_argument("--iso_language_code", type=str, required=True)
+    platform_group = parser.add_mutually_exclusive_group(required=True)
+    platform_group.add_argument(
+        "--platform", type=str, nargs="+", choices=helpers.PLATFORMS
+    )
+    platform_group.add_argument("--all_platforms", action="store_true")
+    parser.add_argument(
+        "--telegram_language_code", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "--iso_language_code", type=str, nargs="+", required=True
+    )
     parser.add_argument("--snapshots_dir", type=Path, required=True)
     parser.add_argument("--prompt_template_filename", type=Path, required=True)
-    parser.add_argument("--openai_api_key", type=str, required=True)
+    parser.add_argument(
+        "--multi_prompt_template_filename", type=Path, default=None
+    )
+    parser.add_argument("--openai_api_key", type=str)
+    parser.add_argument(
+        "--openai_base_url", type=str, default=chatgpt.DEFAULT_BASE_URL
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max_concurrency", type=int, default=100)
+    parser.add_argument("--requests_per_minute", type=float, default=None)
+    parser.add_argument("--tokens_per_minute", type=float, default=None)
+    parser.add_argument("--max_retries", type=int, default=6)
+    parser.add_argument("--connect_timeout", type=float, default=10.0)
+    parser.add_argument("--read_timeout", type=float, default=300.0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--glossary_word_boundary", action="store_true")
+    parser.add_argument("--no_clustering", action="store_true")
+    parser.add_argument("--canonical_data_dir", type=Path, default=None)
+    parser.add_argument(
+        "--canonical_languague_code", type=str, nargs="+", default=None
+    )
+    parser.add_argument("--no_translation_memory", action="store_true")
+    parser.add_argument("--memory_top_k", type=int, default=2)
+    parser.add_argument("--memory_threshold", type=float, default=0.6)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--prune_deleted", action="store_true")
+    parser.add_argument("--diff_only", action="store_true")
+    parser.add_argument("--batch_max_items", type=int, default=64)
+    parser.add_argument("--batch_max_tokens", type=int, default=8000)
+    parser.add_argument(
+        "--batch_max_completion_tokens", type=int, default=3000
+    )
+    phrase_cache.add_arguments(parser)
+    llm_cache.add_arguments(parser)
+    tracing.add_arguments(parser)
+    bulk.add_arguments(parser)
+    validation.add_arguments(parser)
+    parser.add_argument("--validation_jobs", type=int, default=os.cpu_count())
     args = parser.parse_args()
 
-    chatgpt_client: chatgpt.ChatGpt = chatgpt.ChatGpt(
-        api_key=args.openai_api_key
+    if args.openai_api_key is None and not args.diff_only:
+        parser.error("--openai_api_key is required")
+    if (args.canonical_data_dir is None) != (
+        args.canonical_languague_code is None
+    ):
+        parser.error(
+            "--canonical_data_dir and --canonical_languague_code"
+            " go together"
+        )
+    language_codes: list[str] = args.telegram_language_code
+    if len(args.iso_language_code) != len(language_codes) or (
+        args.canonical_languague_code is not None
+        and len(args.canonical_languague_code) != len(language_codes)
+    ):
+        parser.error(
+            "--telegram_language_code, --iso_language_code and"
+            " --canonical_languague_code need one code per language"
+        )
+    if len(language_codes) > 1:
+        if args.multi_prompt_template_filename is None:
+            parser.error(
+                "--multi_prompt_template_filename is required for several"
+                " languages"
+            )
+        if args.bulk:
+            parser.error("--bulk supports a single language")
+
+    cache = phrase_cache.from_args(args)
+    platforms: list[str] = (
+        list(helpers.PLATFORMS) if args.all_platforms else args.platform
     )
 
-    PROMPT_TEMPLATE = open(args.prompt_template_filename).read()
-    LANGUAGE_NAME = dictionaries.get_language_name(args.iso_language_code)
+    response_cache = llm_cache.from_args(args)
+    tracer = tracing.from_args(args)
+    validation_limits = validation.from_args(args)
 
-    snapshot = helpers.Snapshot(
-        args.snapshots_dir, args.telegram_language_code, args.platform
-    )
+    if args.bulk_job_id is not None:
+        job = bulk.Job(args.bulk_jobs_dir, args.bulk_job_id)
+        snapshots = {
+            platform: helpers.Snapshot(
+                args.snapshots_dir,
+                job.manifest["telegram_language_code"],
+                platform,
+            )
+            for platform in job.manifest["platforms"]
+        }
+        try:
+            run_bulk_job(
+                job,
+                bulk.make_backend(
+                    args,
+                    chatgpt.ChatGpt(
+                        args.openai_api_key, base_url=args.openai_base_url
+                    ),
+                ),
+                snapshots,
+                args.bulk_wait,
+                args.bulk_poll_interval,
+            )
+        finally:
+            for snapshot in snapshots.values():
+                snapshot.close()
+            tracer.close()
+        print_usage(tracer, bulk.PRICE_FACTOR)
+        return
 
-    tasks: list[helpers.Task] = helpers.load_tasks(
-        args.defaults_dir, args.platform
+    PROMPT_TEMPLATE = open(args.prompt_template_filename).read()
+    MULTI_PROMPT_TEMPLATE = (
+        open(args.multi_prompt_template_filename).read()
+        if args.multi_prompt_template_filename is not None
+        else PROMPT_TEMPLATE
+    )
+    canonical_language_codes = dict(
+        zip(
+            language_codes,
+            args.canonical_languague_code or [None] * len(language_codes),
+        )
     )
 
-    tasks = [task for task in tasks if task.text_en.strip()]
-    tasks = [task for task in tasks if task.name not in snapshot]
-    tasks.sort(key=lambda task: task.name)
+    def prefix(language_code: str) -> str:
+        return "" if len(language_codes) == 1 else f"{language_code}: "
+
+    # Existing translations that fail validation are translated again.
+    invalid: dict[tuple[str, str], set[str]] = {}
+    if validation_limits is not None:
+        start = time.perf_counter()
+        report = validation.validate_snapshots(
+            args.defaults_dir,
+            args.snapshots_dir,
+            language_codes,
+            platforms,
+            cache,
+            validation_limits,
+            args.validation_jobs,
+        )
+        print(
+            f"{validation.format_summary(report)}"
+            f" in {time.perf_counter() - start:.1f}s"
+        )
+        if args.validation_report is not None:
+            validation.write_report(report, args.validation_report)
+        invalid = report.failing()
+
+    # All languages are diffed against the same source tasks, and the tasks
+    # any of them is missing are translated together.
+    snapshots: dict[str, dict[str, helpers.Snapshot]] = {
+        language_code: {} for language_code in language_codes
+    }
+    pending: dict[str, dict[str, set[str]]] = {
+        language_code: {} for language_code in language_codes
+    }
+    tasks_by_platform: dict[str, dict[str, helpers.Task]] = {}
+    for platform in platforms:
+        sources = helpers.load_sources(args.defaults_dir, platform, cache)
+        source_tasks = [helpers.Task(*row) for row in sources.join("en", "ru")]
+        source_names = helpers.source_names(sources)
+        platform_tasks = tasks_by_platform[platform] = {}
+        for language_code in language_codes:
+            filename = (
+                args.snapshots_dir / language_code / platform
+            ).with_suffix(".json")
+            if not filename.exists():
+                print(f"{prefix(language_code)}{platform}: no snapshot")
+                continue
+            snapshot = helpers.Snapshot(
+                args.snapshots_dir, language_code, platform
+            )
+            diff = helpers.diff_tasks(source_tasks, snapshot, source_names)
+            print(
+                f"{prefix(language_code)}{platform}: {len(diff.new)} new,"
+                f" {len(diff.changed)} changed, {len(diff.deleted)} deleted,"
+                f" {len(diff.unchanged)} unchanged,"
+                f" {len(diff.unknown)} without source hash"
+            )
+
+            tasks = diff.new
+            if args.incremental:
+                tasks = diff.new + diff.changed
+                # Translations made before source hashes were recorded are
+                # assumed to match the current source.
+                for task in diff.unknown:
+                    snapshot.set_source_hash(
+                        task.name, helpers.source_hash(task)
+                    )
+            if args.prune_deleted:
+                for name in diff.deleted:
+                    snapshot.remove_phrase(name)
+            invalid_names = invalid.get((language_code, platform), set())
+            if invalid_names:
+                names = {task.name for task in tasks}
+                tasks = tasks + [
+                    task
+                    for task in source_tasks
+                    if task.name in invalid_names and task.name not in names
+                ]
+                print(
+                    f"{prefix(language_code)}{platform}:"
+                    f" {len(invalid_names)} failed validation"
+                )
+            tasks = [task for task in tasks if task.text_en.strip()]
+            snapshots[language_code][platform] = snapshot
+            pending[language_code][platform] = {task.name for task in tasks}
+            for task in tasks:
+                platform_tasks.setdefault(task.name, task)
 
-    dictionary: dictionaries.Dictionary = dictionaries.load_dictionary(
-        args.iso_language_code
+    if args.diff_only:
+        return
+
+    tasks, all_targets = helpers.deduplicate_tasks(
+        {
+            platform: list(platform_tasks.values())
+            for platform, platform_tasks in tasks_by_platform.items()
+        }
     )
+    tasks.sort(key=lambda task: task.name)
+    source_hashes = {task.name: helpers.source_hash(task) for task in tasks}
+    unique_count = len(tasks)
+    targets: dict[str, dict[str, list[tuple[str, str]]]] = {
+        language_code: {} for language_code in language_codes
+    }
+    for name, names in all_targets.items():
+        for language_code in language_codes:
+            language_names = [
+                (platform, task_name)
+                for platform, task_name in names
+                if task_name in pending[language_code].get(platform, ())
+            ]
+            if language_names:
+                targets[language_code][name] = language_names
+    task_languages = {
+        task.name: [
+            language_code
+            for language_code in language_codes
+            if task.name in targets[language_code]
+        ]
+        for task in tasks
+    }
+
+    translation_memories: dict[str, memory.TranslationMemory] = {}
+    if not args.no_translation_memory:
+        for language_code in language_codes:
+            start = time.perf_counter()
+            translation_memory = memory.build_memory(
+                args.defaults_dir,
+                args.snapshots_dir,
+                language_code,
+                args.canonical_data_dir,
+                canonical_language_codes[language_code],
+                cache,
+                snapshots[language_code],
+                top_k=args.memory_top_k,
+                threshold=args.memory_threshold,
+            )
+            build_time = time.perf_counter() - start
+            resolved = []
+            for task in tasks:
+                if language_code not in task_languages[task.name]:
+                    continue
+                text = translation_memory.lookup(task)
+                if text is not None and (
+                    validation_limits is None
+                    or not validation.check(task, text, validation_limits)
+                ):
+                    resolved.append(helpers.Phrase(task.name, text))
+                    task_languages[task.name].remove(language_code)
+            apply_phrases(
+                resolved,
+                targets[language_code],
+                source_hashes,
+                snapshots[language_code],
+            )
+            translation_memories[language_code] = translation_memory
+            print(
+                f"{prefix(language_code)}Translation memory:"
+                f" {len(translation_memory)} entries"
+                f" (built in {build_time:.1f}s),"
+                f" {len(resolved)} tasks resolved from it"
+            )
+
+    languages = {
+        language_code: translation.Language(
+            language_code,
+            dictionaries.get_language_name(iso_language_code),
+            dictionaries.load_dictionary(iso_language_code),
+            translation_memories.get(language_code),
+        )
+        for language_code, iso_language_code in zip(
+            language_codes, args.iso_language_code
+        )
+    }
 
-    BATCH_SIZE = 32
+    def plan(
+        groups: list[list[helpers.Task]], batch_language_codes: tuple[str, ...]
+    ) -> list[translation.Batch]:
+        return batching.plan_grouped_batches(
+            groups,
+            (
+                PROMPT_TEMPLATE
+                if len(batch_language_codes) == 1
+                else MULTI_PROMPT_TEMPLATE
+            ),
+            tuple(
+                languages[language_code]
+                for language_code in batch_language_codes
+            ),
+            args.glossary_word_boundary,
+            max_tokens=args.batch_max_tokens,
+            max_completion_tokens=args.batch_max_completion_tokens,
+            max_items=args.batch_max_items,
+            validation_limits=validation_limits,
+        )
 
-    batches = []
-    slice = []
+    # Tasks are batched together with the ones missing the same languages.
+    tasks_by_languages: dict[tuple[str, ...], list[helpers.Task]] = {}
     for task in tasks:
-        slice.append(task)
-        if len(slice) >= BATCH_SIZE:
-            batches.append(
-                Batch(
-                    tasks=slice,
-                    prompt_template=PROMPT_TEMPLATE,
-                    language_name=LANGUAGE_NAME,
-                    dictionary=dictionary,
-                )
+        if task_languages[task.name]:
+            tasks_by_languages.setdefault(
+                tuple(task_languages[task.name]), []
+            ).append(task)
+
+    planned_batches = []
+    derivations = {}
+    sent_count = 0
+    derived_count = 0
+    group_count = 0
+    for batch_language_codes, language_tasks in tasks_by_languages.items():
+        if args.no_clustering:
+            groups = [[task] for task in language_tasks]
+        else:
+            task_clustering = clustering.cluster_tasks(language_tasks)
+            groups = task_clustering.groups
+            derivations.update(task_clustering.derivations)
+            derived_count += task_clustering.derived_count
+            group_count += sum(len(group) > 1 for group in groups)
+        sent_count += sum(len(group) for group in groups)
+        planned_batches.extend(plan(groups, batch_language_codes))
+    if not args.no_clustering:
+        print(
+            f"Clustering: {derived_count} LLM items saved by"
+            " deriving placeholder variants,"
+            f" {group_count} groups of near-duplicates"
+            + ("" if clustering.np else " (install numpy to find them)")
+        )
+
+    batches, estimates = batching.order_largest_first(planned_batches)
+
+    total_count = sum(
+        len(names)
+        for language_pending in pending.values()
+        for names in language_pending.values()
+    )
+    # Batching every platform and language on its own would fit as many
+    # keys into a batch as the plan does on average.
+    keys_per_batch = (
+        sum(len(batch.tasks) * len(batch.languages) for batch in batches)
+        / len(batches)
+        if batches
+        else args.batch_max_items
+    )
+    separate_batch_count = sum(
+        math.ceil(len(names) / keys_per_batch)
+        for language_pending in pending.values()
+        for names in language_pending.values()
+        if names
+    )
+    print(
+        f"Tasks: {total_count}, unique: {unique_count}"
+        f" (dedup ratio {total_count / max(unique_count, 1):.2f}x),"
+        f" sent to the LLM: {sent_count}"
+        f" ({unique_count - sent_count} never reach the API)"
+    )
+    print(
+        f"Batch count: {len(batches)}"
+        f" (requests saved: {separate_batch_count - len(batches)})"
+    )
+    print(batching.format_plan_summary(estimates))
+
+    if args.bulk:
+        sync_client = chatgpt.ChatGpt(
+            args.openai_api_key, base_url=args.openai_base_url
+        )
+        language_code = language_codes[0]
+        job = bulk.Job.create(
+            args.bulk_jobs_dir,
+            batches,
+            sync_client,
+            language_code,
+            targets[language_code],
+            source_hashes,
+            derivations,
+        )
+        print(f"Created bulk job {job.job_id} with {len(batches)} requests")
+        try:
+            run_bulk_job(
+                job,
+                bulk.make_backend(args, sync_client),
+                snapshots[language_code],
+                args.bulk_wait,
+                args.bulk_poll_interval,
             )
-            slice = []
-    if slice:
-        batches.append(
-            Batch(
-                tasks=slice,
-                prompt_template=PROMPT_TEMPLATE,
-                language_name=LANGUAGE_NAME,
-                dictionary=dictionary,
+        finally:
+            close_snapshots(snapshots)
+            tracer.close()
+        print_usage(tracer, bulk.PRICE_FACTOR)
+        return
+
+    request_scheduler = scheduler.Scheduler(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        initial_concurrency=args.concurrency,
+        max_concurrency=args.max_concurrency,
+        max_retries=args.max_retries,
+    )
+    chatgpt_client = chatgpt.AsyncChatGpt(
+        api_key=args.openai_api_key,
+        cache=response_cache,
+        base_url=args.openai_base_url,
+        pool_size=args.max_concurrency,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        scheduler=request_scheduler,
+    )
+    try:
+        asyncio.run(
+            run_batches(
+                batches,
+                chatgpt_client,
+                targets,
+                source_hashes,
+                snapshots,
+                derivations,
+                stream=args.stream,
             )
         )
-    print("Batch count:", len(batches))
+    finally:
+        close_snapshots(snapshots)
+        tracer.close()
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        future_to_batch = {
-            executor.submit(process_batch, batch, chatgpt_client): batch
-            for batch in batches
-        }
-        for future in concurrent.futures.as_completed(future_to_batch):
-            try:
-                phrases: list[helpers.Phrase] = future.result()
-            except Exception as ex:
-                print(f"Exception when processing a batch: {ex}")
-            else:
-                print(f"Done batch at {datetime.datetime.now()}")
-                for phrase in phrases:
-                    snapshot.update_phrase(phrase)
-                snapshot.save()
+    print(
+        f"Scheduler: {request_scheduler.retries} retries"
+        f" {request_scheduler.errors},"
+        f" final concurrency {int(request_scheduler.concurrency)}"
+    )
+    if response_cache is not None:
+        print(
+            f"LLM cache: {response_cache.hits} hits,"
+            f" {response_cache.misses} misses"
+        )
+    print_usage(tracer)
 
 
 if __name__ == "__main__":
@@ -1,95 +1,205 @@
 import argparse
+import concurrent.futures
+import os
 import pathlib
+import time
+import typing
 
 import util.helpers as helpers
+import util.phrase_cache as phrase_cache
+import util.phrase_table as phrase_table
+import util.shards as shards
 
 
 Path = pathlib.Path
 
 
-def make_xml(translation: list[tuple[str, str]]) -> str:
-    res = []
-    res.append('<?xml version="1.0" encoding="utf-8"?>')
-    res.append("<resources>")
-    for name, text in translation:
-        res.append(f'  <string name="{name}">{text}</string>')
-    res.append("</resources>\n")
+class Language(typing.NamedTuple):
+    telegram_language_code: str
+    canonical_language_code: str
+    output_dir: Path
 
-    return "\n".join(res).encode("utf-8")
 
+class ExportJob(typing.NamedTuple):
+    platform: str
+    defaults_dir: Path
+    default_language_code: str
+    canonical_data_dir: Path
+    snapshots_dir: Path
+    languages: list[Language]
+    cache: phrase_cache.PhraseCache | None
+    limits: shards.Limits
 
-def make_strings(translation: list[tuple[str, str]]) -> str:
-    res = []
-    for name, text in translation:
-        res.append(f'"{name}" = "{text}";')
 
-    return "\n".join(res).encode("utf-8")
+STAGES = ("defaults", "canonical", "snapshot", "merge", "write")
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--defaults_dir", type=Path, required=True)
-    parser.add_argument("--default_languague_code", type=str, required=True)
-    parser.add_argument("--canonical_data_dir", type=Path, required=True)
-    parser.add_argument("--canonical_languague_code", type=str, required=True)
-    parser.add_argument("--platform", type=str, required=True)
-    parser.add_argument("--snapshots_dir", type=Path, required=True)
-    parser.add_argument("--output_dir", type=Path, required=True)
-    parser.add_argument("--telegram_language_code", type=str, required=True)
-    args = parser.parse_args()
+def merge_translation(
+    table: phrase_table.PhraseTable, snapshot: helpers.Snapshot
+) -> list[tuple[str, str]]:
+    canonical_count = sum(1 for _ in table.modified("canonical", "default"))
+    print(f"Canonical phrases: {canonical_count}")
+
+    table.add("snapshot", snapshot.phrases.items())
+    return table.overlay("canonical", "default", "snapshot")
 
-    snapshot = helpers.Snapshot(
-        args.snapshots_dir, args.telegram_language_code, args.platform
-    )
 
-    canonical_phrases: list[helpers.Phrase] = helpers.load_phrases(
-        args.canonical_data_dir, args.canonical_languague_code, args.platform
+def write_translation(
+    translation: list[tuple[str, str]],
+    platform: str,
+    output_dir: Path,
+    limits: shards.Limits = shards.Limits(),
+) -> list[Path]:
+    fmt = (
+        shards.XML_FORMAT
+        if platform in helpers.XML_PLATFORMS
+        else shards.STRINGS_FORMAT
     )
-    default_phrases: list[helpers.Phrase] = helpers.load_phrases(
-        args.defaults_dir, args.default_languague_code, args.platform
+    return shards.write_shards(translation, fmt, output_dir, platform, limits)
+
+
+def export_platform(job: ExportJob) -> dict[str, float]:
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    start = time.perf_counter()
+    table = phrase_table.PhraseTable()
+    table.add(
+        "default",
+        helpers.load_entries(
+            job.defaults_dir,
+            job.default_language_code,
+            job.platform,
+            job.cache,
+        ),
     )
+    timings["defaults"] += time.perf_counter() - start
+
+    for language in job.languages:
+        start = time.perf_counter()
+        table.add(
+            "canonical",
+            helpers.load_entries(
+                job.canonical_data_dir,
+                language.canonical_language_code,
+                job.platform,
+                job.cache,
+            ),
+            base="default",
+        )
+        timings["canonical"] += time.perf_counter() - start
 
-    default_phrases = {phrase.name: phrase for phrase in default_phrases}
+        start = time.perf_counter()
+        snapshot = helpers.Snapshot(
+            job.snapshots_dir, language.telegram_language_code, job.platform
+        )
+        timings["snapshot"] += time.perf_counter() - start
 
-    translation = {}
+        start = time.perf_counter()
+        translation = merge_translation(table, snapshot)
+        timings["merge"] += time.perf_counter() - start
 
-    for phrase in canonical_phrases:
-        default_phrase = default_phrases[phrase.name]
-        if phrase.text == default_phrase.text:
-            continue
-        translation[phrase.name] = phrase.text
+        start = time.perf_counter()
+        write_translation(
+            translation, job.platform, language.output_dir, job.limits
+        )
+        timings["write"] += time.perf_counter() - start
+
+    return timings
+
+
+def format_timings(timings: dict[str, dict[str, float]]) -> str:
+    lines = [
+        f"{'platform':<10}"
+        + "".join(f" {stage:>10}" for stage in STAGES)
+        + f" {'total':>10}"
+    ]
+    for platform, platform_timings in timings.items():
+        lines.append(
+            f"{platform:<10}"
+            + "".join(
+                f" {platform_timings[stage] * 1000:>8.1f}ms"
+                for stage in STAGES
+            )
+            + f" {sum(platform_timings.values()) * 1000:>8.1f}ms"
+        )
 
-    print(f"Canonical phrases: {len(translation)}")
+    return "\n".join(lines)
 
-    for name, text in snapshot.phrases.items():
-        if name in translation:
-            continue
-        translation[name] = text
 
-    translation = sorted(translation.items())
-    half = len(translation) // 2
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--defaults_dir", type=Path, required=True)
+    parser.add_argument("--default_languague_code", type=str, required=True)
+    parser.add_argument("--canonical_data_dir", type=Path, required=True)
+    parser.add_argument(
+        "--canonical_languague_code", type=str, nargs="+", required=True
+    )
+    platform_group = parser.add_mutually_exclusive_group(required=True)
+    platform_group.add_argument(
+        "--platform", type=str, nargs="+", choices=helpers.PLATFORMS
+    )
+    platform_group.add_argument("--all_platforms", action="store_true")
+    parser.add_argument("--snapshots_dir", type=Path, required=True)
+    parser.add_argument("--output_dir", type=Path, required=True)
+    parser.add_argument(
+        "--telegram_language_code", type=str, nargs="+", required=True
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    phrase_cache.add_arguments(parser)
+    shards.add_arguments(parser)
+    args = parser.parse_args()
 
-    output_filename_scheme: Path = args.output_dir / "platform.ext"
-    if args.platform in ("android", "android_x", "unigram"):
-        output_filename_scheme = output_filename_scheme.with_suffix(".xml")
-        output = open(
-            output_filename_scheme.with_stem(f"{args.platform}_1"), "wb"
+    if len(args.telegram_language_code) != len(args.canonical_languague_code):
+        parser.error(
+            "--telegram_language_code and --canonical_languague_code must"
+            " list the same number of languages"
         )
-        output.write(make_xml(translation[:half]))
-        output = open(
-            output_filename_scheme.with_stem(f"{args.platform}_2"), "wb"
+
+    cache = phrase_cache.from_args(args)
+    platforms: list[str] = (
+        list(helpers.PLATFORMS) if args.all_platforms else args.platform
+    )
+
+    languages = [
+        Language(
+            telegram_language_code,
+            canonical_language_code,
+            (
+                args.output_dir / telegram_language_code
+                if len(args.telegram_language_code) > 1
+                else args.output_dir
+            ),
         )
-        output.write(make_xml(translation[half:]))
-    else:
-        output_filename_scheme = output_filename_scheme.with_suffix(".strings")
-        output = open(
-            output_filename_scheme.with_stem(f"{args.platform}_1"), "wb"
+        for telegram_language_code, canonical_language_code in zip(
+            args.telegram_language_code, args.canonical_languague_code
         )
-        output.write(make_strings(translation[:half]))
-        output = open(
-            output_filename_scheme.with_stem(f"{args.platform}_2"), "wb"
+    ]
+    jobs = [
+        ExportJob(
+            platform=platform,
+            defaults_dir=args.defaults_dir,
+            default_language_code=args.default_languague_code,
+            canonical_data_dir=args.canonical_data_dir,
+            snapshots_dir=args.snapshots_dir,
+            languages=languages,
+            cache=cache,
+            limits=shards.from_args(args),
         )
-        output.write(make_strings(translation[half:]))
+        for platform in platforms
+    ]
+
+    start = time.perf_counter()
+    if len(jobs) > 1 and args.jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(args.jobs, len(jobs))
+        ) as executor:
+            results = list(executor.map(export_platform, jobs))
+    else:
+        results = [export_platform(job) for job in jobs]
+    wall_time = time.perf_counter() - start
+
+    print(format_timings(dict(zip(platforms, results))))
+    print(f"Wall time: {wall_time * 1000:.1f}ms")
 
 
 if __name__ == "__main__":
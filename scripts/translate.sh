@@ -6,11 +6,10 @@ SCRIPT_DIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" &>/dev/null && pwd)
 
 do_translate() {
   lang=$1
-  platform=$2
-  iso_code=$3
+  iso_code=$2
   python3 make_basic_translation.py \
     --defaults_dir data/default \
-    --platform ${platform} \
+    --all_platforms \
     --telegram_language_code=${lang} \
     --iso_language_code=${iso_code} \
     --snapshots_dir data/snapshots \
@@ -25,6 +24,4 @@ cd ${SCRIPT_DIR}/..
 lang=$1
 iso_code=$2
 
-for platform in android android_x tdesktop ios macos weba webk unigram; do
-  do_translate ${lang} ${platform} ${iso_code}
-done
+do_translate ${lang} ${iso_code}
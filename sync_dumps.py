@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import pathlib
+import sys
+import time
+import typing
+
+import util.helpers as helpers
+import util.http_pool as http_pool
+
+
+Path = pathlib.Path
+
+DEFAULT_BASE_URL = "https://translations.telegram.org"
+DEFAULT_LANGUAGE_CODES = ("en", "ru")
+CANONICAL_LANGUAGE_CODES = ("bashkort-alifba", "tatar-cyrill")
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class Dump(typing.NamedTuple):
+    language_code: str
+    platform: str
+    filename: Path
+    key: str
+
+
+class Result(typing.NamedTuple):
+    dump: Dump
+    status: str
+    validators: dict[str, str | None]
+    size: int
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_dumps(
+    data_dir: Path, language_codes: list[str], platforms: list[str]
+) -> list[Dump]:
+    dumps = []
+    for language_code in language_codes:
+        base_path = data_dir / (
+            "default"
+            if language_code in DEFAULT_LANGUAGE_CODES
+            else "canonical"
+        )
+        for platform in platforms:
+            filename = helpers.phrases_filename(
+                base_path, language_code, platform
+            )
+            dumps.append(
+                Dump(
+                    language_code,
+                    platform,
+                    filename,
+                    filename.relative_to(data_dir).as_posix(),
+                )
+            )
+    return dumps
+
+
+async def fetch(
+    pool: http_pool.ConnectionPool,
+    dump: Dump,
+    validators: dict[str, str | None],
+    retries: int,
+) -> Result:
+    headers = {"Accept-Encoding": "gzip"}
+    if dump.filename.exists():
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    path = f"/{dump.language_code}/{dump.platform}/export"
+    for attempt in range(retries + 1):
+        # OSError covers connection resets, timeouts, DNS and TLS errors.
+        try:
+            response = await pool.request("GET", path, headers=headers)
+        except (OSError, asyncio.IncompleteReadError) as ex:
+            if attempt == retries:
+                print(f"{path}: {ex!r}", file=sys.stderr)
+                return Result(dump, "failed", validators, 0)
+        else:
+            if response.status not in RETRY_STATUSES or attempt == retries:
+                break
+        await asyncio.sleep(2**attempt)
+
+    if response.status == 304:
+        return Result(dump, "unchanged", validators, 0)
+    if response.status != 200:
+        print(f"{path}: HTTP {response.status}", file=sys.stderr)
+        return Result(dump, "failed", validators, 0)
+
+    data = response.body
+    if response.headers.get("content-encoding", "").lower() == "gzip":
+        data = gzip.decompress(data)
+    new_validators = {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "sha256": _hash(data),
+    }
+
+    # Servers without validators still send the full dump, so an identical
+    # one is detected by its hash and the file is left untouched.
+    current_hash = validators.get("sha256")
+    if current_hash is None and dump.filename.exists():
+        current_hash = _hash(open(dump.filename, "rb").read())
+    if dump.filename.exists() and current_hash == new_validators["sha256"]:
+        return Result(dump, "unchanged", new_validators, len(data))
+
+    dump.filename.parent.mkdir(parents=True, exist_ok=True)
+    helpers.write_atomic(dump.filename, data)
+    return Result(dump, "changed", new_validators, len(data))
+
+
+async def sync(
+    base_url: str,
+    dumps: list[Dump],
+    state: dict[str, dict[str, str | None]],
+    concurrency: int = 8,
+    retries: int = 3,
+    read_timeout: float = 60.0,
+) -> list[Result]:
+    pool = http_pool.ConnectionPool(
+        base_url, size=concurrency, read_timeout=read_timeout
+    )
+    try:
+        results = await asyncio.gather(
+            *(
+                fetch(pool, dump, state.get(dump.key, {}), retries)
+                for dump in dumps
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        await pool.close()
+    # One broken dump must not lose the state of the others.
+    for i, (dump, result) in enumerate(zip(dumps, results)):
+        if isinstance(result, Exception):
+            print(f"{dump.key}: {result!r}", file=sys.stderr)
+            results[i] = Result(dump, "failed", state.get(dump.key, {}), 0)
+        elif isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def make_manifest(results: list[Result]) -> dict[str, typing.Any]:
+    manifest = {"changed": [], "unchanged": [], "failed": []}
+    for result in results:
+        manifest[result.status].append(
+            {
+                "language_code": result.dump.language_code,
+                "platform": result.dump.platform,
+                "filename": str(result.dump.filename),
+            }
+        )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=Path, default=Path("data"))
+    language_group = parser.add_mutually_exclusive_group(required=True)
+    language_group.add_argument("--all", action="store_true")
+    language_group.add_argument("--defaults", action="store_true")
+    language_group.add_argument("--language_code", type=str, nargs="+")
+    parser.add_argument(
+        "--platform",
+        type=str,
+        nargs="+",
+        choices=helpers.PLATFORMS,
+        default=list(helpers.PLATFORMS),
+    )
+    parser.add_argument("--base_url", type=str, default=DEFAULT_BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--read_timeout", type=float, default=60.0)
+    parser.add_argument("--state_filename", type=Path, default=None)
+    parser.add_argument("--manifest_filename", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.all:
+        language_codes = [*DEFAULT_LANGUAGE_CODES, *CANONICAL_LANGUAGE_CODES]
+    elif args.defaults:
+        language_codes = list(DEFAULT_LANGUAGE_CODES)
+    else:
+        language_codes = args.language_code
+    state_filename = args.state_filename or args.data_dir / "sync_state.json"
+    manifest_filename = (
+        args.manifest_filename or args.data_dir / "sync_manifest.json"
+    )
+
+    state = {}
+    if state_filename.exists():
+        state = json.loads(open(state_filename, "rb").read())
+
+    start = time.perf_counter()
+    results = asyncio.run(
+        sync(
+            args.base_url,
+            make_dumps(args.data_dir, language_codes, args.platform),
+            state,
+            concurrency=args.concurrency,
+            retries=args.retries,
+            read_timeout=args.read_timeout,
+        )
+    )
+    wall_time = time.perf_counter() - start
+
+    for result in results:
+        state[result.dump.key] = result.validators
+    state_filename.parent.mkdir(parents=True, exist_ok=True)
+    helpers.write_atomic(
+        state_filename,
+        json.dumps(state, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    manifest = make_manifest(results)
+    helpers.write_atomic(
+        manifest_filename,
+        json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"),
+    )
+
+    print(
+        f"{len(manifest['changed'])} changed,"
+        f" {len(manifest['unchanged'])} unchanged,"
+        f" {len(manifest['failed'])} failed,"
+        f" {sum(result.size for result in results)} bytes"
+        f" in {wall_time:.2f}s"
+    )
+    for entry in manifest["changed"]:
+        print(f"Changed: {entry['filename']}")
+    if manifest["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks import fake_openai, fake_translations
+
+
+@pytest.fixture
+def openai_server(monkeypatch):
+    # The fake keeps its settings and counters on the handler class.
+    monkeypatch.setattr(fake_openai.Handler, "latency", 0.0)
+    monkeypatch.setattr(fake_openai.Handler, "statuses", {})
+    monkeypatch.setattr(fake_openai.Handler, "latencies", [])
+    server = fake_openai.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def translations_server(monkeypatch, tmp_path):
+    monkeypatch.setattr(fake_translations.Handler, "data_dir", tmp_path)
+    monkeypatch.setattr(fake_translations.Handler, "latency", 0.0)
+    monkeypatch.setattr(fake_translations.Handler, "statuses", {})
+    server = fake_translations.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+import util.http_pool as http_pool
+from benchmarks import fake_openai
+
+
+BODY = json.dumps(
+    {
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": 'There are 1 text strings\n1.\n"""Hello"""\n'
+                        '"""Привет"""',
+                    }
+                ],
+            }
+        ]
+    }
+).encode("utf-8")
+
+
+async def post(pool: http_pool.ConnectionPool) -> http_pool.HttpResponse:
+    return await pool.request(
+        "POST",
+        "/chat/completions",
+        {"Content-Type": "application/json"},
+        BODY,
+    )
+
+
+def test_reuses_keep_alive_connection(openai_server):
+    async def run() -> http_pool.ConnectionPool:
+        pool = http_pool.ConnectionPool(openai_server)
+        try:
+            for _ in range(3):
+                response = await post(pool)
+                assert response.status == 200
+                assert json.loads(response.body)["choices"]
+            return pool
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()).opened == 1
+
+
+def test_drops_connection_closed_while_idle(openai_server, monkeypatch):
+    monkeypatch.setattr(fake_openai.Handler, "timeout", 0.2)
+
+    async def run() -> http_pool.ConnectionPool:
+        pool = http_pool.ConnectionPool(openai_server)
+        try:
+            assert (await post(pool)).status == 200
+            # The event loop sees the server's FIN while sleeping.
+            await asyncio.sleep(0.5)
+            assert (await post(pool)).status == 200
+            return pool
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()).opened == 2
+
+
+def test_retries_on_connection_closed_by_server(openai_server, monkeypatch):
+    monkeypatch.setattr(fake_openai.Handler, "timeout", 0.2)
+
+    async def run() -> http_pool.ConnectionPool:
+        pool = http_pool.ConnectionPool(openai_server)
+        try:
+            assert (await post(pool)).status == 200
+            # Block the loop so the idle connection still looks open and
+            # the failure only shows up when the request is sent.
+            time.sleep(0.5)
+            assert pool.idle and not pool.idle[0].reader.at_eof()
+            assert (await post(pool)).status == 200
+            return pool
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()).opened == 2
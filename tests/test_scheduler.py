@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+import util.chatgpt as chatgpt
+import util.scheduler as scheduler
+from benchmarks import fake_openai
+
+
+PROMPT = 'There are 1 text strings\n1.\n"""Hello"""\n"""Привет"""'
+
+
+def translate(
+    base_url: str, request_scheduler: scheduler.Scheduler, count: int = 1
+) -> list[str]:
+    async def run() -> list[str]:
+        client = chatgpt.AsyncChatGpt(
+            "test", base_url=base_url, scheduler=request_scheduler
+        )
+        try:
+            return await asyncio.gather(
+                *(client.get_response_async(PROMPT) for _ in range(count))
+            )
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_retries_rate_limits_until_success(openai_server, monkeypatch):
+    monkeypatch.setattr(fake_openai.Handler, "rate_limit_rate", 0.5)
+    monkeypatch.setattr(fake_openai.Handler, "retry_after", 0.0)
+    request_scheduler = scheduler.Scheduler(
+        initial_concurrency=4, max_retries=30, base_backoff=0.01
+    )
+    answers = translate(openai_server, request_scheduler, count=20)
+    assert answers == ['1. """Привет"""'] * 20
+    statuses = fake_openai.Handler.statuses
+    assert statuses[200] == 20
+    assert request_scheduler.retries == statuses.get(429, 0)
+    assert request_scheduler.errors == (
+        {"HTTP 429": statuses[429]} if statuses.get(429) else {}
+    )
+
+
+def test_gives_up_after_max_retries_honouring_retry_after(
+    openai_server, monkeypatch
+):
+    monkeypatch.setattr(fake_openai.Handler, "rate_limit_rate", 1.0)
+    monkeypatch.setattr(fake_openai.Handler, "retry_after", 0.2)
+    request_scheduler = scheduler.Scheduler(
+        initial_concurrency=8, max_retries=2, base_backoff=0.01
+    )
+    start = time.monotonic()
+    with pytest.raises(chatgpt.ApiError) as error:
+        translate(openai_server, request_scheduler)
+    assert error.value.status == 429
+    assert time.monotonic() - start >= 2 * 0.2
+    assert fake_openai.Handler.statuses == {429: 3}
+    assert request_scheduler.retries == 2
+    # Errors within one latency window halve the window only once.
+    assert request_scheduler.concurrency == 4
+
+
+def test_retries_server_errors(openai_server, monkeypatch):
+    monkeypatch.setattr(fake_openai.Handler, "server_error_rate", 1.0)
+    request_scheduler = scheduler.Scheduler(max_retries=1, base_backoff=0.01)
+    with pytest.raises(chatgpt.ApiError) as error:
+        translate(openai_server, request_scheduler)
+    assert error.value.status == 500
+    assert request_scheduler.errors == {"HTTP 500": 1}
+
+
+def test_window_grows_additively_on_success(openai_server):
+    request_scheduler = scheduler.Scheduler(initial_concurrency=2)
+    translate(openai_server, request_scheduler, count=4)
+    assert 2 < request_scheduler.concurrency < 4
+    assert request_scheduler.retries == 0
+
+
+def test_backoff_is_bounded_and_respects_retry_after():
+    request_scheduler = scheduler.Scheduler(base_backoff=1.0, max_backoff=4.0)
+    error = chatgpt.ApiError(429, {}, b"")
+    for attempt in range(6):
+        delay = request_scheduler._backoff(error, attempt)
+        assert 0 <= delay <= min(4.0, 2**attempt)
+
+    error = chatgpt.ApiError(429, {"retry-after": "30"}, b"")
+    assert request_scheduler._backoff(error, 0) >= 30
+    assert request_scheduler.resume_at >= time.monotonic() + 29
@@ -0,0 +1,72 @@
+import asyncio
+import pathlib
+
+import sync_dumps
+import util.helpers as helpers
+from benchmarks import fake_translations
+
+
+Path = pathlib.Path
+
+
+def serve_dump(server_dir: Path, data: bytes) -> None:
+    filename = helpers.phrases_filename(server_dir / "default", "en", "weba")
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename.write_bytes(data)
+
+
+def sync_dump(base_url: str, data_dir: Path, state: dict) -> sync_dumps.Result:
+    dumps = sync_dumps.make_dumps(data_dir, ["en"], ["weba"])
+    (result,) = asyncio.run(sync_dumps.sync(base_url, dumps, state))
+    state[result.dump.key] = result.validators
+    return result
+
+
+def test_skips_unchanged_and_replaces_changed_dumps(
+    translations_server, tmp_path
+):
+    shipped_dir = Path(__file__).parents[1] / "data" / "default"
+    source = helpers.phrases_filename(shipped_dir, "en", "weba")
+    data = source.read_bytes()
+    serve_dump(tmp_path, data)
+    data_dir = tmp_path / "client"
+    state = {}
+
+    result = sync_dump(translations_server, data_dir, state)
+    assert result.status == "changed"
+    assert result.dump.filename.read_bytes() == data
+    stat = result.dump.filename.stat()
+
+    result = sync_dump(translations_server, data_dir, state)
+    assert result.status == "unchanged"
+    assert fake_translations.Handler.statuses == {200: 1, 304: 1}
+    assert result.dump.filename.stat().st_mtime_ns == stat.st_mtime_ns
+
+    serve_dump(tmp_path, data + b'"extra" = "Extra";\n')
+    result = sync_dump(translations_server, data_dir, state)
+    assert result.status == "changed"
+    assert result.dump.filename.read_bytes().endswith(b'"Extra";\n')
+    # The new dump is renamed into place rather than written over the old.
+    assert result.dump.filename.stat().st_ino != stat.st_ino
+    assert [path.name for path in result.dump.filename.parent.iterdir()] == [
+        result.dump.filename.name
+    ]
+
+
+def test_skips_unchanged_dump_without_validators(
+    translations_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(fake_translations.Handler, "validators", False)
+    serve_dump(tmp_path, b'"hello" = "Hello";\n')
+    data_dir = tmp_path / "client"
+    state = {}
+
+    assert sync_dump(translations_server, data_dir, state).status == "changed"
+    filename = sync_dumps.make_dumps(data_dir, ["en"], ["weba"])[0].filename
+    stat = filename.stat()
+    # Without validators only the hash of the full response can tell.
+    for state in (state, {}):
+        result = sync_dump(translations_server, data_dir, state)
+        assert result.status == "unchanged"
+        assert filename.stat().st_mtime_ns == stat.st_mtime_ns
+    assert fake_translations.Handler.statuses == {200: 3}
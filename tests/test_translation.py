@@ -0,0 +1,32 @@
+import util.dictionaries as dictionaries
+import util.helpers as helpers
+import util.translation as translation
+
+
+def make_batch() -> translation.Batch:
+    return translation.Batch(
+        tasks=[
+            helpers.Task("Quoted", 'Say "hi"', 'Скажи "привет"'),
+            helpers.Task("Plain", "Hello", "Привет"),
+        ],
+        prompt_template="",
+        languages=(
+            translation.Language(
+                "bashkir-ex-ru", "Bashkir", dictionaries.ba, None
+            ),
+        ),
+    )
+
+
+def test_answer_stream_keeps_closing_quote_at_every_split():
+    batch = make_batch()
+    content = '1. """Әйт "сәләм""""\n2. """Сәләм"""\n'
+    expected = translation.parse_response(batch, content)
+    assert [answer.texts["bashkir-ex-ru"] for answer in expected] == [
+        'Әйт "сәләм"',
+        "Сәләм",
+    ]
+    for offset in range(len(content) + 1):
+        stream = translation.AnswerStream(batch)
+        answers = stream.feed(content[:offset]) + stream.feed(content)
+        assert answers == expected, offset
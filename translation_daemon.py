@@ -0,0 +1,799 @@
+import argparse
+import asyncio
+import contextlib
+import http.server
+import json
+import pathlib
+import signal
+import socketserver
+import sys
+import threading
+import time
+import typing
+import urllib.parse
+
+import merge_and_prepare_candidate
+import util.batching as batching
+import util.chatgpt as chatgpt
+import util.dictionaries as dictionaries
+import util.helpers as helpers
+import util.llm_cache as llm_cache
+import util.memory as memory
+import util.phrase_cache as phrase_cache
+import util.phrase_table as phrase_table
+import util.scheduler as scheduler
+import util.shards as shards
+import util.tracing as tracing
+import util.translation as translation
+import util.validation as validation
+import util.work_queue as work_queue
+
+
+Path = pathlib.Path
+
+DEFAULT_QUEUE_FILENAME = Path("data") / "work_queue.jsonl"
+# Keys found by watching the dumps wait behind explicitly enqueued ones.
+AUTO_PRIORITY = 10
+MAX_ATTEMPTS = 3
+ERROR_BACKOFF = 5.0
+
+
+class Language(typing.NamedTuple):
+    telegram_language_code: str
+    iso_language_code: str
+    canonical_language_code: str
+
+
+class Corpus:
+    def __init__(
+        self,
+        defaults_dir: Path,
+        canonical_data_dir: Path,
+        snapshots_dir: Path,
+        languages: list[Language],
+        platforms: list[str],
+        cache: phrase_cache.PhraseCache | None,
+        with_memory: bool = True,
+        memory_top_k: int = 2,
+        memory_threshold: float = 0.6,
+    ) -> None:
+        # Parsed dumps and translation memories of every language are guarded
+        # by the lock, each snapshot by its own lock, taken after the first.
+        self.defaults_dir: Path = defaults_dir
+        self.canonical_data_dir: Path = canonical_data_dir
+        self.languages: dict[str, Language] = {
+            language.telegram_language_code: language for language in languages
+        }
+        self.platforms: list[str] = platforms
+        self.cache: phrase_cache.PhraseCache | None = cache
+        self.with_memory: bool = with_memory
+        self.memory_top_k: int = memory_top_k
+        self.memory_threshold: float = memory_threshold
+        self.lock: threading.RLock = threading.RLock()
+        self.tables: dict[str, phrase_table.PhraseTable] = {}
+        self.stamps: dict[Path, tuple[int, int] | None] = {}
+        self.memories: dict[str, memory.TranslationMemory] = {}
+        self.snapshots: dict[tuple[str, str], helpers.Snapshot] = {}
+        self.snapshot_locks: dict[tuple[str, str], threading.Lock] = {}
+        for language_code in self.languages:
+            for platform in platforms:
+                filename = (
+                    snapshots_dir / language_code / platform
+                ).with_suffix(".json")
+                if filename.exists():
+                    self.snapshots[language_code, platform] = helpers.Snapshot(
+                        snapshots_dir, language_code, platform
+                    )
+                    self.snapshot_locks[language_code, platform] = (
+                        threading.Lock()
+                    )
+
+    def dumps(self) -> list[tuple[str, Path, str, str | None]]:
+        # Columns of a platform table with their dump and base column.
+        return [
+            ("en", self.defaults_dir, "en", None),
+            ("ru", self.defaults_dir, "ru", None),
+        ] + [
+            (
+                f"canonical/{language_code}",
+                self.canonical_data_dir,
+                language.canonical_language_code,
+                "ru",
+            )
+            for language_code, language in self.languages.items()
+        ]
+
+    @staticmethod
+    def _stamp(filename: Path) -> tuple[int, int] | None:
+        try:
+            stat = filename.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed_platforms(self) -> list[str]:
+        changed = []
+        for platform in self.platforms:
+            for _, base_path, language_code, _ in self.dumps():
+                filename = helpers.phrases_filename(
+                    base_path, language_code, platform
+                )
+                if (
+                    filename not in self.stamps
+                    or self._stamp(filename) != self.stamps[filename]
+                ):
+                    changed.append(platform)
+                    break
+        return changed
+
+    def load_platform(self, platform: str) -> None:
+        table = phrase_table.PhraseTable()
+        stamps = {}
+        for column, base_path, language_code, base in self.dumps():
+            filename = helpers.phrases_filename(
+                base_path, language_code, platform
+            )
+            # Taken before parsing, so a dump replaced meanwhile is reloaded
+            # on the next check.
+            stamps[filename] = self._stamp(filename)
+            entries = []
+            if stamps[filename] is not None:
+                entries = helpers.load_entries(
+                    base_path, language_code, platform, self.cache
+                )
+            table.add(column, entries, base=base)
+        with self.lock:
+            self.tables[platform] = table
+            self.stamps.update(stamps)
+
+    def tasks(self, platform: str) -> list[helpers.Task]:
+        return [
+            helpers.Task(*row)
+            for row in self.tables[platform].join("en", "ru")
+        ]
+
+    def task(self, platform: str, name: str) -> helpers.Task | None:
+        table = self.tables[platform]
+        text_en = table.get("en", name)
+        text_ru = table.get("ru", name)
+        if text_en is None or text_ru is None:
+            return None
+        return helpers.Task(name, text_en, text_ru)
+
+    def build_memories(self) -> None:
+        if not self.with_memory:
+            return
+        with self.lock:
+            for language_code in self.languages:
+                translation_memory = memory.TranslationMemory(
+                    self.memory_top_k, self.memory_threshold
+                )
+                for platform in self.platforms:
+                    key = (language_code, platform)
+                    with self.snapshot_locks.get(
+                        key, contextlib.nullcontext()
+                    ):
+                        memory.add_platform(
+                            translation_memory,
+                            {task.name: task for task in self.tasks(platform)},
+                            self.tables[platform].items(
+                                f"canonical/{language_code}"
+                            ),
+                            self.snapshots.get(key),
+                        )
+                self.memories[language_code] = translation_memory
+
+    def language(self, language_code: str) -> translation.Language:
+        iso_language_code = self.languages[language_code].iso_language_code
+        return translation.Language(
+            language_code,
+            dictionaries.get_language_name(iso_language_code),
+            dictionaries.load_dictionary(iso_language_code),
+            self.memories.get(language_code),
+        )
+
+    def phrase(
+        self, language_code: str, platform: str, name: str
+    ) -> str | None:
+        with self.snapshot_locks[language_code, platform]:
+            return self.snapshots[language_code, platform].phrases.get(name)
+
+    def apply(
+        self,
+        language_code: str,
+        phrases: list[helpers.Phrase],
+        targets: dict[str, list[tuple[str, str]]],
+        tasks: dict[str, helpers.Task],
+    ) -> None:
+        updates: dict[str, list[tuple[helpers.Phrase, str]]] = {}
+        with self.lock:
+            translation_memory = self.memories.get(language_code)
+            for phrase in phrases:
+                task = tasks[phrase.name]
+                for platform, name in targets[phrase.name]:
+                    updates.setdefault(platform, []).append(
+                        (
+                            helpers.Phrase(name, phrase.text),
+                            helpers.source_hash(task),
+                        )
+                    )
+                if translation_memory is not None:
+                    translation_memory.add(task, phrase.text)
+        # Saving fsyncs the journal, so other workers only wait for it when
+        # they touch the same snapshot.
+        for platform, platform_updates in updates.items():
+            with self.snapshot_locks[language_code, platform]:
+                snapshot = self.snapshots[language_code, platform]
+                for phrase, source_hash in platform_updates:
+                    snapshot.update_phrase(phrase, source_hash)
+                snapshot.save()
+
+    def merge(
+        self, language_code: str, platform: str
+    ) -> list[tuple[str, str]]:
+        with self.lock:
+            table = self.tables[platform]
+            with self.snapshot_locks[language_code, platform]:
+                table.add(
+                    "snapshot",
+                    self.snapshots[language_code, platform].phrases.items(),
+                )
+            try:
+                return table.overlay(
+                    f"canonical/{language_code}", "ru", "snapshot"
+                )
+            finally:
+                table.remove("snapshot")
+
+    def close(self) -> None:
+        for key, snapshot in self.snapshots.items():
+            with self.snapshot_locks[key]:
+                snapshot.close()
+
+
+class Daemon:
+    def __init__(
+        self,
+        corpus: Corpus,
+        queue: work_queue.WorkQueue,
+        chatgpt_client: chatgpt.AsyncChatGpt,
+        loop: asyncio.AbstractEventLoop,
+        tracer: tracing.Tracer,
+        prompt_template: str,
+        glossary_word_boundary: bool = False,
+        batch_max_items: int = 64,
+        batch_max_tokens: int = 8000,
+        batch_max_completion_tokens: int = 3000,
+        limits: shards.Limits = shards.Limits(),
+        auto_enqueue: bool = True,
+        validation_limits: validation.Limits | None = None,
+    ) -> None:
+        self.corpus: Corpus = corpus
+        self.queue: work_queue.WorkQueue = queue
+        self.chatgpt_client: chatgpt.AsyncChatGpt = chatgpt_client
+        # Requests run on this loop, so all workers share the scheduler.
+        self.loop: asyncio.AbstractEventLoop = loop
+        self.tracer: tracing.Tracer = tracer
+        self.prompt_template: str = prompt_template
+        self.glossary_word_boundary: bool = glossary_word_boundary
+        self.batch_max_items: int = batch_max_items
+        self.batch_max_tokens: int = batch_max_tokens
+        self.batch_max_completion_tokens: int = batch_max_completion_tokens
+        self.limits: shards.Limits = limits
+        self.auto_enqueue: bool = auto_enqueue
+        self.validation_limits: validation.Limits | None = validation_limits
+        self.stopping: threading.Event = threading.Event()
+        self.lock: threading.Lock = threading.Lock()
+        self.attempts: dict[work_queue.Item, int] = {}
+        self.stats: dict[str, int] = {
+            "translated": 0,
+            "resolved": 0,
+            "skipped": 0,
+            "failed": 0,
+        }
+        self.started_at: float = time.monotonic()
+
+    def _count(self, field: str, value: int) -> None:
+        with self.lock:
+            self.stats[field] += value
+
+    def enqueue(
+        self,
+        language_code: str,
+        platform: str | None = None,
+        names: list[str] | None = None,
+        priority: int = 0,
+    ) -> int:
+        if language_code not in self.corpus.languages:
+            raise ValueError(f"Unknown language code: {language_code}")
+        platforms = (
+            [platform] if platform is not None else self.corpus.platforms
+        )
+        items = []
+        for platform in platforms:
+            if (language_code, platform) not in self.corpus.snapshots:
+                if len(platforms) == 1:
+                    raise ValueError(
+                        f"No {platform} snapshot for {language_code}"
+                    )
+                continue
+            if names is None:
+                with self.corpus.lock, self.corpus.snapshot_locks[
+                    language_code, platform
+                ]:
+                    diff = helpers.diff_tasks(
+                        self.corpus.tasks(platform),
+                        self.corpus.snapshots[language_code, platform],
+                        helpers.source_names(self.corpus.tables[platform]),
+                    )
+                platform_names = [
+                    task.name
+                    for task in diff.new + diff.changed
+                    if task.text_en.strip()
+                ]
+            else:
+                platform_names = names
+            items.extend(
+                work_queue.Item(language_code, platform, name)
+                for name in platform_names
+            )
+        return self.queue.put(items, priority)
+
+    def refresh(self) -> list[str]:
+        platforms = self.corpus.changed_platforms()
+        if not platforms:
+            return platforms
+        start = time.perf_counter()
+        for platform in platforms:
+            self.corpus.load_platform(platform)
+        self.corpus.build_memories()
+        print(
+            f"Loaded {', '.join(platforms)} in"
+            f" {time.perf_counter() - start:.1f}s"
+        )
+        if self.auto_enqueue:
+            for language_code in self.corpus.languages:
+                for platform in platforms:
+                    if (language_code, platform) in self.corpus.snapshots:
+                        queued = self.enqueue(
+                            language_code, platform, priority=AUTO_PRIORITY
+                        )
+                        if queued:
+                            print(
+                                f"{language_code}: {platform}: queued"
+                                f" {queued} new or changed keys"
+                            )
+        return platforms
+
+    def validate(self, report_filename: Path | None = None) -> int:
+        start = time.perf_counter()
+        reports = []
+        with self.corpus.lock:
+            for key, snapshot in self.corpus.snapshots.items():
+                language_code, platform = key
+                with self.corpus.snapshot_locks[key]:
+                    reports.append(
+                        validation.validate_phrases(
+                            language_code,
+                            platform,
+                            self.corpus.tasks(platform),
+                            snapshot.phrases,
+                            self.validation_limits,
+                        )
+                    )
+        report = validation.merge_reports(reports)
+        print(
+            f"{validation.format_summary(report)}"
+            f" in {time.perf_counter() - start:.1f}s"
+        )
+        if report_filename is not None:
+            validation.write_report(report, report_filename)
+        return sum(
+            self.enqueue(language_code, platform, sorted(names), AUTO_PRIORITY)
+            for (language_code, platform), names in report.failing().items()
+        )
+
+    def watch(self, poll_interval: float) -> None:
+        while not self.stopping.wait(poll_interval):
+            try:
+                self.refresh()
+            except Exception as ex:
+                print(f"Exception when reloading dumps: {ex!r}")
+
+    def work(self) -> None:
+        while not self.stopping.is_set():
+            items = self.queue.take(self.batch_max_items, timeout=1.0)
+            if not items:
+                continue
+            try:
+                error = self.process(items)
+            except Exception as ex:
+                print(f"Exception when processing items: {ex!r}")
+                self.retry(items)
+                error = True
+            if error:
+                self.stopping.wait(ERROR_BACKOFF)
+
+    def retry(self, items: list[work_queue.Item]) -> None:
+        given_up = []
+        for item in items:
+            with self.lock:
+                attempts = self.attempts[item] = self.attempts.get(item, 0) + 1
+            if attempts >= MAX_ATTEMPTS:
+                print(f"Giving up on task: {item.platform}/{item.name}")
+                given_up.append(item)
+            else:
+                self.queue.release(
+                    [item], (self.queue.priority(item) or 0) + 1
+                )
+        with self.lock:
+            for item in given_up:
+                self.attempts.pop(item, None)
+        self._count("failed", len(given_up))
+        self.queue.done(given_up)
+
+    def process(self, items: list[work_queue.Item]) -> bool:
+        language_code = items[0].language_code
+        with self.corpus.lock:
+            tasks_by_platform: dict[str, list[helpers.Task]] = {}
+            for item in items:
+                task = self.corpus.task(item.platform, item.name)
+                if task is not None and task.text_en.strip():
+                    tasks_by_platform.setdefault(item.platform, []).append(
+                        task
+                    )
+            tasks, targets = helpers.deduplicate_tasks(tasks_by_platform)
+            tasks_by_name = {task.name: task for task in tasks}
+
+            translation_memory = self.corpus.memories.get(language_code)
+            resolved = []
+            remaining = []
+            for task in tasks:
+                text = (
+                    translation_memory.lookup(task)
+                    if translation_memory is not None
+                    else None
+                )
+                if text is not None and {
+                    self.corpus.phrase(language_code, platform, name)
+                    for platform, name in targets[task.name]
+                } == {text}:
+                    # The memory only knows the key's own translation, e.g.
+                    # when the key was enqueued to be translated again.
+                    text = None
+                if text is not None and self.validation_limits is not None:
+                    if validation.check(task, text, self.validation_limits):
+                        text = None
+                if text is None:
+                    remaining.append(task)
+                else:
+                    resolved.append(helpers.Phrase(task.name, text))
+            language = self.corpus.language(language_code)
+        self.corpus.apply(language_code, resolved, targets, tasks_by_name)
+        answered = {phrase.name for phrase in resolved}
+        self._count("resolved", len(resolved))
+
+        error = False
+        throttled = set()
+        for batch in batching.plan_batches(
+            remaining,
+            self.prompt_template,
+            (language,),
+            self.glossary_word_boundary,
+            max_tokens=self.batch_max_tokens,
+            max_completion_tokens=self.batch_max_completion_tokens,
+            max_items=self.batch_max_items,
+            validation_limits=self.validation_limits,
+        ):
+            try:
+                answers = asyncio.run_coroutine_threadsafe(
+                    translation.process_batch_async(
+                        batch, self.chatgpt_client
+                    ),
+                    self.loop,
+                ).result()
+            except Exception as ex:
+                print(f"Exception when processing a batch: {ex!r}")
+                error = True
+                if scheduler.is_retryable(ex):
+                    # The scheduler ran out of retries on rate limits or
+                    # server errors, which says nothing about the keys.
+                    throttled.update(task.name for task in batch.tasks)
+                continue
+            phrases = [
+                helpers.Phrase(answer.name, answer.texts[language_code])
+                for answer in answers
+            ]
+            self.corpus.apply(language_code, phrases, targets, tasks_by_name)
+            answered.update(phrase.name for phrase in phrases)
+            self._count("translated", len(phrases))
+
+        unique_names = {
+            (platform, name): unique_name
+            for unique_name, names in targets.items()
+            for platform, name in names
+        }
+        finished = []
+        throttled_items = []
+        failed = []
+        for item in items:
+            unique_name = unique_names.get((item.platform, item.name))
+            if unique_name is None:
+                # The key is gone from the defaults or has no source text.
+                self._count("skipped", 1)
+                finished.append(item)
+            elif unique_name in answered:
+                finished.append(item)
+            elif unique_name in throttled:
+                throttled_items.append(item)
+            else:
+                failed.append(item)
+        with self.lock:
+            for item in finished:
+                self.attempts.pop(item, None)
+        self.queue.done(finished)
+        for item in throttled_items:
+            self.queue.release([item], self.queue.priority(item) or 0)
+        self.retry(failed)
+        return error
+
+    def progress(self) -> dict[str, typing.Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        return {
+            **self.queue.counts(),
+            **stats,
+            "requests": self.tracer.total("batch", "requests"),
+            "prompt_tokens": self.tracer.total("batch", "prompt_tokens"),
+            "completion_tokens": self.tracer.total(
+                "batch", "completion_tokens"
+            ),
+            "uptime": round(time.monotonic() - self.started_at, 1),
+        }
+
+    def export(
+        self,
+        language_code: str,
+        output_dir: Path,
+        platforms: list[str] | None = None,
+    ) -> dict[str, typing.Any]:
+        if language_code not in self.corpus.languages:
+            raise ValueError(f"Unknown language code: {language_code}")
+        start = time.perf_counter()
+        filenames = []
+        for platform in platforms or self.corpus.platforms:
+            if (language_code, platform) not in self.corpus.snapshots:
+                continue
+            filenames.extend(
+                merge_and_prepare_candidate.write_translation(
+                    self.corpus.merge(language_code, platform),
+                    platform,
+                    output_dir,
+                    self.limits,
+                )
+            )
+        return {
+            "files": [str(filename) for filename in filenames],
+            "time": round(time.perf_counter() - start, 3),
+        }
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    daemon: Daemon | None = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict[str, typing.Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == "/progress":
+            self.send_json(200, self.daemon.progress())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if path == "/enqueue":
+                payload = {
+                    "queued": self.daemon.enqueue(
+                        request["language_code"],
+                        request.get("platform"),
+                        request.get("names"),
+                        int(request.get("priority", 0)),
+                    )
+                }
+            elif path == "/export":
+                payload = self.daemon.export(
+                    request["language_code"],
+                    Path(request["output_dir"]),
+                    request.get("platforms"),
+                )
+            else:
+                self.send_json(404, {"error": "Not found"})
+                return
+        except (KeyError, TypeError, ValueError) as ex:
+            self.send_json(400, {"error": repr(ex)})
+            return
+        self.send_json(200, payload)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--defaults_dir", type=Path, required=True)
+    parser.add_argument("--canonical_data_dir", type=Path, required=True)
+    parser.add_argument("--snapshots_dir", type=Path, required=True)
+    parser.add_argument(
+        "--telegram_language_code", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "--iso_language_code", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "--canonical_languague_code", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "--platform",
+        type=str,
+        nargs="+",
+        choices=helpers.PLATFORMS,
+        default=list(helpers.PLATFORMS),
+    )
+    parser.add_argument("--prompt_template_filename", type=Path, required=True)
+    parser.add_argument("--openai_api_key", type=str, required=True)
+    parser.add_argument(
+        "--openai_base_url", type=str, default=chatgpt.DEFAULT_BASE_URL
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max_concurrency", type=int, default=100)
+    parser.add_argument("--requests_per_minute", type=float, default=None)
+    parser.add_argument("--tokens_per_minute", type=float, default=None)
+    parser.add_argument("--max_retries", type=int, default=6)
+    parser.add_argument("--connect_timeout", type=float, default=10.0)
+    parser.add_argument("--read_timeout", type=float, default=300.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--glossary_word_boundary", action="store_true")
+    parser.add_argument("--no_translation_memory", action="store_true")
+    parser.add_argument("--memory_top_k", type=int, default=2)
+    parser.add_argument("--memory_threshold", type=float, default=0.6)
+    parser.add_argument("--batch_max_items", type=int, default=64)
+    parser.add_argument("--batch_max_tokens", type=int, default=8000)
+    parser.add_argument(
+        "--batch_max_completion_tokens", type=int, default=3000
+    )
+    parser.add_argument(
+        "--queue_filename", type=Path, default=DEFAULT_QUEUE_FILENAME
+    )
+    parser.add_argument("--poll_interval", type=float, default=5.0)
+    parser.add_argument("--no_auto_enqueue", action="store_true")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--socket_path", type=Path, default=None)
+    phrase_cache.add_arguments(parser)
+    llm_cache.add_arguments(parser)
+    tracing.add_arguments(parser)
+    shards.add_arguments(parser)
+    validation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not (
+        len(args.telegram_language_code)
+        == len(args.iso_language_code)
+        == len(args.canonical_languague_code)
+    ):
+        parser.error(
+            "--telegram_language_code, --iso_language_code and"
+            " --canonical_languague_code need one code per language"
+        )
+
+    tracer = tracing.from_args(args)
+    corpus = Corpus(
+        args.defaults_dir,
+        args.canonical_data_dir,
+        args.snapshots_dir,
+        [
+            Language(*codes)
+            for codes in zip(
+                args.telegram_language_code,
+                args.iso_language_code,
+                args.canonical_languague_code,
+            )
+        ],
+        args.platform,
+        phrase_cache.from_args(args),
+        not args.no_translation_memory,
+        args.memory_top_k,
+        args.memory_threshold,
+    )
+    chatgpt_client = chatgpt.AsyncChatGpt(
+        api_key=args.openai_api_key,
+        cache=llm_cache.from_args(args),
+        base_url=args.openai_base_url,
+        pool_size=args.max_concurrency,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        scheduler=scheduler.Scheduler(
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+            initial_concurrency=args.concurrency,
+            max_concurrency=args.max_concurrency,
+            max_retries=args.max_retries,
+        ),
+    )
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    daemon = Daemon(
+        corpus,
+        work_queue.WorkQueue(args.queue_filename),
+        chatgpt_client,
+        loop,
+        tracer,
+        open(args.prompt_template_filename).read(),
+        args.glossary_word_boundary,
+        batch_max_items=args.batch_max_items,
+        batch_max_tokens=args.batch_max_tokens,
+        batch_max_completion_tokens=args.batch_max_completion_tokens,
+        limits=shards.from_args(args),
+        auto_enqueue=not args.no_auto_enqueue,
+        validation_limits=validation.from_args(args),
+    )
+    daemon.refresh()
+    if daemon.validation_limits is not None:
+        queued = daemon.validate(args.validation_report)
+        print(f"Queued {queued} keys that failed validation")
+
+    Handler.daemon = daemon
+    if args.socket_path is not None:
+        args.socket_path.unlink(missing_ok=True)
+        server = UnixServer(str(args.socket_path), Handler)
+        address = args.socket_path
+    else:
+        server = http.server.ThreadingHTTPServer(
+            (args.host, args.port), Handler
+        )
+        address = f"http://{args.host}:{server.server_port}"
+
+    threads = [
+        threading.Thread(target=daemon.work) for _ in range(args.workers)
+    ] + [threading.Thread(target=daemon.watch, args=(args.poll_interval,))]
+    for thread in threads:
+        thread.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Serving on {address}, {daemon.queue.counts()['pending']} queued")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Waiting for the batches in flight")
+        daemon.stopping.set()
+        for thread in threads:
+            thread.join()
+        asyncio.run_coroutine_threadsafe(chatgpt_client.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+        server.server_close()
+        if args.socket_path is not None:
+            args.socket_path.unlink(missing_ok=True)
+        corpus.close()
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
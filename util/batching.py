@@ -0,0 +1,244 @@
+import typing
+
+from . import chatgpt
+from . import dictionaries
+from . import glossary
+from . import helpers
+from . import memory
+from . import translation
+from . import validation
+
+
+# USD per million tokens for gpt-4o-2024-05-13.
+PROMPT_TOKEN_PRICE = 5.0
+COMPLETION_TOKEN_PRICE = 15.0
+
+
+class Estimate(typing.NamedTuple):
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def estimate_completion_tokens(
+    task: helpers.Task, language_count: int = 1
+) -> int:
+    # Bashkir and Tatar translations in the snapshots are as long as their
+    # Russian source.
+    return language_count * (chatgpt.estimate_tokens(task.text_ru) + 2)
+
+
+def estimate_batch(batch: translation.Batch) -> Estimate:
+    return Estimate(
+        chatgpt.estimate_tokens(translation.make_prompt(batch)),
+        sum(
+            estimate_completion_tokens(task, len(batch.languages))
+            for task in batch.tasks
+        ),
+    )
+
+
+def plan_batches(
+    tasks: list[helpers.Task],
+    prompt_template: str,
+    languages: tuple[translation.Language, ...],
+    glossary_word_boundary: bool = False,
+    max_tokens: int = 8000,
+    max_completion_tokens: int = 3000,
+    max_items: int = 64,
+    validation_limits: validation.Limits | None = None,
+) -> list[translation.Batch]:
+    return plan_grouped_batches(
+        [[task] for task in tasks],
+        prompt_template,
+        languages,
+        glossary_word_boundary,
+        max_tokens=max_tokens,
+        max_completion_tokens=max_completion_tokens,
+        max_items=max_items,
+        validation_limits=validation_limits,
+    )
+
+
+def plan_grouped_batches(
+    groups: list[list[helpers.Task]],
+    prompt_template: str,
+    languages: tuple[translation.Language, ...],
+    glossary_word_boundary: bool = False,
+    max_tokens: int = 8000,
+    max_completion_tokens: int = 3000,
+    max_items: int = 64,
+    validation_limits: validation.Limits | None = None,
+) -> list[translation.Batch]:
+    dictionary = dictionaries.merge_dictionaries(
+        tuple(language.dictionary for language in languages)
+    )
+    matcher = glossary.get_matcher(dictionary, glossary_word_boundary)
+    base_tokens = chatgpt.estimate_tokens(
+        translation.format_prompt(
+            prompt_template, languages, max_items, "", "", ""
+        )
+    )
+
+    def make_batch(batch_tasks: list[helpers.Task]) -> translation.Batch:
+        return translation.Batch(
+            tasks=batch_tasks,
+            prompt_template=prompt_template,
+            languages=languages,
+            glossary_word_boundary=glossary_word_boundary,
+            validation=validation_limits,
+        )
+
+    def estimate_task(
+        task: helpers.Task,
+        index: int,
+        known_snippet_ids: set[int],
+        known_examples: list[list[memory.Entry]],
+    ) -> tuple[frozenset[int], list[list[memory.Entry]], int, int]:
+        task_snippet_ids = matcher.match_ids(task.text_en, task.text_ru)
+        task_prompt_tokens = chatgpt.estimate_tokens(
+            f'{index + 1}.\n"""{task.text_en}"""\n' f'"""{task.text_ru}"""\n\n'
+        ) + sum(
+            chatgpt.estimate_tokens(
+                helpers.format_snippets([dictionary.snippets[snippet_id]])
+            )
+            for snippet_id in task_snippet_ids - known_snippet_ids
+        )
+        # The prompt takes the memory matches of every task up to a limit.
+        task_examples = []
+        for language, language_examples in zip(languages, known_examples):
+            new_examples = []
+            if language.memory is not None:
+                for match in language.memory.search(task):
+                    if (
+                        len(language_examples) + len(new_examples)
+                        < memory.MAX_BATCH_EXAMPLES
+                        and match.entry not in language_examples
+                        and match.entry not in new_examples
+                    ):
+                        new_examples.append(match.entry)
+            if new_examples:
+                task_prompt_tokens += chatgpt.estimate_tokens(
+                    memory.format_entries(new_examples)
+                    if language_examples
+                    else memory.format_memory(new_examples, language.name)
+                )
+            task_examples.append(new_examples)
+        return (
+            task_snippet_ids,
+            task_examples,
+            task_prompt_tokens,
+            estimate_completion_tokens(task, len(languages)),
+        )
+
+    batches = []
+    batch_tasks = []
+    snippet_ids = set()
+    examples = [[] for _ in languages]
+    prompt_tokens = base_tokens
+    completion_tokens = 0
+
+    def fits(
+        count: int, task_prompt_tokens: int, task_completion_tokens: int
+    ) -> bool:
+        return (
+            len(batch_tasks) + count <= max_items
+            and completion_tokens + task_completion_tokens
+            <= max_completion_tokens
+            and prompt_tokens
+            + task_prompt_tokens
+            + completion_tokens
+            + task_completion_tokens
+            <= max_tokens
+        )
+
+    for group in groups:
+        if len(group) > 1 and batch_tasks:
+            # Keep near-duplicates in one batch when the whole group fits
+            # into an empty one.
+            estimates = [
+                estimate_task(
+                    task, len(batch_tasks) + i, snippet_ids, examples
+                )
+                for i, task in enumerate(group)
+            ]
+            if not fits(
+                len(group),
+                sum(estimate[2] for estimate in estimates),
+                sum(estimate[3] for estimate in estimates),
+            ):
+                batches.append(make_batch(batch_tasks))
+                batch_tasks = []
+                snippet_ids = set()
+                examples = [[] for _ in languages]
+                prompt_tokens = base_tokens
+                completion_tokens = 0
+
+        for task in group:
+            (
+                task_snippet_ids,
+                task_examples,
+                task_prompt_tokens,
+                task_completion_tokens,
+            ) = estimate_task(task, len(batch_tasks), snippet_ids, examples)
+            if batch_tasks and not fits(
+                1, task_prompt_tokens, task_completion_tokens
+            ):
+                batches.append(make_batch(batch_tasks))
+                batch_tasks = []
+                snippet_ids = set()
+                examples = [[] for _ in languages]
+                prompt_tokens = base_tokens
+                completion_tokens = 0
+                (
+                    task_snippet_ids,
+                    task_examples,
+                    task_prompt_tokens,
+                    task_completion_tokens,
+                ) = estimate_task(task, 0, snippet_ids, examples)
+
+            batch_tasks.append(task)
+            snippet_ids |= task_snippet_ids
+            for language_examples, new_examples in zip(
+                examples, task_examples
+            ):
+                language_examples.extend(new_examples)
+            prompt_tokens += task_prompt_tokens
+            completion_tokens += task_completion_tokens
+    if batch_tasks:
+        batches.append(make_batch(batch_tasks))
+
+    return batches
+
+
+def order_largest_first(
+    batches: list[translation.Batch],
+) -> tuple[list[translation.Batch], list[Estimate]]:
+    estimated = sorted(
+        ((batch, estimate_batch(batch)) for batch in batches),
+        key=lambda item: item[1].total_tokens,
+        reverse=True,
+    )
+    return [batch for batch, _ in estimated], [
+        estimate for _, estimate in estimated
+    ]
+
+
+def format_plan_summary(estimates: list[Estimate]) -> str:
+    prompt_tokens = sum(estimate.prompt_tokens for estimate in estimates)
+    completion_tokens = sum(
+        estimate.completion_tokens for estimate in estimates
+    )
+    cost = (
+        prompt_tokens * PROMPT_TOKEN_PRICE
+        + completion_tokens * COMPLETION_TOKEN_PRICE
+    ) / 1_000_000
+    largest = max((estimate.total_tokens for estimate in estimates), default=0)
+    return (
+        f"Plan: {len(estimates)} batches,"
+        f" ~{prompt_tokens} prompt + ~{completion_tokens} completion tokens"
+        f" (largest batch ~{largest}), estimated cost ${cost:.2f}"
+    )
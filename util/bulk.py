@@ -0,0 +1,369 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import pathlib
+import time
+import typing
+import urllib.error
+import urllib.request
+
+from . import chatgpt
+from . import clustering
+from . import helpers
+from . import tracing
+from . import translation
+from . import validation
+
+
+Path = pathlib.Path
+
+DEFAULT_JOBS_DIR: Path = (
+    Path(__file__).resolve().parent.parent / ".cache" / "bulk"
+)
+ENDPOINT = "/v1/chat/completions"
+# Batch API requests are billed at half the synchronous price.
+PRICE_FACTOR = 0.5
+
+# Batch API states after which no more results will appear.
+FINISHED_STATES = ("completed", "expired", "cancelled")
+FAILED_STATES = ("failed",)
+
+
+class Backend(typing.Protocol):
+    def submit(self, requests_filename: Path) -> str: ...
+
+    def status(self, remote_id: str) -> str: ...
+
+    def download(self, remote_id: str, results_filename: Path) -> None: ...
+
+
+class OpenAiBackend:
+    def __init__(
+        self, api_key: str, base_url: str = chatgpt.DEFAULT_BASE_URL
+    ) -> None:
+        self.base_url: str = base_url.rstrip("/")
+        self.headers: dict[str, str] = {
+            "Authorization": f"Bearer {api_key}",
+        }
+
+    def _request(
+        self,
+        path: str,
+        data: bytes | None = None,
+        content_type: str = "application/json",
+    ) -> bytes:
+        headers = dict(self.headers)
+        if data is not None:
+            headers["Content-Type"] = content_type
+        request = urllib.request.Request(
+            f"{self.base_url}{path}", headers=headers, data=data
+        )
+        try:
+            return urllib.request.urlopen(request).read()
+        except urllib.error.HTTPError as ex:
+            raise chatgpt.ApiError(ex.code, dict(ex.headers), ex.read())
+
+    def submit(self, requests_filename: Path) -> str:
+        boundary = os.urandom(16).hex()
+        body = (
+            (
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+                "batch\r\n"
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="file";'
+                f' filename="{requests_filename.name}"\r\n'
+                "Content-Type: application/jsonl\r\n\r\n"
+            ).encode("utf-8")
+            + open(requests_filename, "rb").read()
+            + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        )
+        file_id = json.loads(
+            self._request(
+                "/files",
+                body,
+                f"multipart/form-data; boundary={boundary}",
+            )
+        )["id"]
+        return json.loads(
+            self._request(
+                "/batches",
+                json.dumps(
+                    {
+                        "input_file_id": file_id,
+                        "endpoint": ENDPOINT,
+                        "completion_window": "24h",
+                    }
+                ).encode("utf-8"),
+            )
+        )["id"]
+
+    def _batch(self, remote_id: str) -> dict[str, typing.Any]:
+        return json.loads(self._request(f"/batches/{remote_id}"))
+
+    def status(self, remote_id: str) -> str:
+        return self._batch(remote_id)["status"]
+
+    def download(self, remote_id: str, results_filename: Path) -> None:
+        data = b""
+        for key in ("output_file_id", "error_file_id"):
+            file_id = self._batch(remote_id).get(key)
+            if file_id:
+                data += self._request(f"/files/{file_id}/content")
+        helpers.write_atomic(results_filename, data)
+
+
+class LocalBackend:
+    def __init__(
+        self,
+        directory: Path,
+        client: chatgpt.ChatGpt,
+        workers: int = 8,
+    ) -> None:
+        self.directory: Path = directory
+        self.client: chatgpt.ChatGpt = client
+        self.workers: int = workers
+
+    def _run(self, line: bytes) -> dict[str, typing.Any]:
+        request = json.loads(line)
+        result = {"custom_id": request["custom_id"], "error": None}
+        http_request = urllib.request.Request(
+            self.client.base_url + request["url"].removeprefix("/v1"),
+            headers=self.client.headers,
+            data=json.dumps(request["body"]).encode("utf-8"),
+        )
+        try:
+            body = urllib.request.urlopen(http_request).read()
+            result["response"] = {
+                "status_code": 200,
+                "body": json.loads(body),
+            }
+        except urllib.error.HTTPError as ex:
+            result["response"] = {
+                "status_code": ex.code,
+                "body": {"error": ex.read().decode("utf-8", "replace")},
+            }
+        # URLError is an OSError, which also covers connection resets and
+        # timeouts; one failed request must not lose the rest of the batch.
+        except OSError as ex:
+            result["response"] = None
+            result["error"] = {"code": type(ex).__name__, "message": str(ex)}
+        return result
+
+    def submit(self, requests_filename: Path) -> str:
+        remote_id = f"local-{os.urandom(6).hex()}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        helpers.write_atomic(
+            self.directory / f"{remote_id}.input.jsonl",
+            open(requests_filename, "rb").read(),
+        )
+        return remote_id
+
+    def status(self, remote_id: str) -> str:
+        output_filename = self.directory / f"{remote_id}.output.jsonl"
+        if not output_filename.exists():
+            lines = open(
+                self.directory / f"{remote_id}.input.jsonl", "rb"
+            ).readlines()
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+                results = list(pool.map(self._run, lines))
+            helpers.write_atomic(
+                output_filename,
+                b"".join(
+                    json.dumps(result, ensure_ascii=False).encode("utf-8")
+                    + b"\n"
+                    for result in results
+                ),
+            )
+        return "completed"
+
+    def download(self, remote_id: str, results_filename: Path) -> None:
+        helpers.write_atomic(
+            results_filename,
+            open(self.directory / f"{remote_id}.output.jsonl", "rb").read(),
+        )
+
+
+class Job:
+    def __init__(self, jobs_dir: Path, job_id: str) -> None:
+        self.job_id: str = job_id
+        self.directory: Path = jobs_dir / job_id
+        self.manifest_filename: Path = self.directory / "job.json"
+        self.requests_filename: Path = self.directory / "requests.jsonl"
+        self.results_filename: Path = self.directory / "results.jsonl"
+        self.manifest: dict[str, typing.Any] = json.loads(
+            open(self.manifest_filename, "rb").read()
+        )
+
+    @classmethod
+    def create(
+        cls,
+        jobs_dir: Path,
+        batches: list[translation.Batch],
+        chatgpt_client: chatgpt.ChatGpt,
+        telegram_language_code: str,
+        targets: dict[str, list[tuple[str, str]]],
+        source_hashes: dict[str, str],
+        derivations: dict[str, list[clustering.Derivation]] | None = None,
+    ) -> "Job":
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+        directory = jobs_dir / job_id
+        directory.mkdir(parents=True)
+
+        requests = []
+        batch_tasks = {}
+        for i, batch in enumerate(batches):
+            custom_id = f"batch-{i}"
+            requests.append(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": ENDPOINT,
+                    "body": chatgpt_client._make_payload(
+                        translation.make_prompt(batch)
+                    ),
+                }
+            )
+            batch_tasks[custom_id] = [list(task) for task in batch.tasks]
+        helpers.write_atomic(
+            directory / "requests.jsonl",
+            b"".join(
+                json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n"
+                for request in requests
+            ),
+        )
+
+        platforms = sorted(
+            {platform for names in targets.values() for platform, _ in names}
+        )
+        manifest = {
+            "job_id": job_id,
+            "state": "created",
+            "remote_id": None,
+            "telegram_language_code": telegram_language_code,
+            "platforms": platforms,
+            "batches": batch_tasks,
+            "targets": targets,
+            "source_hashes": source_hashes,
+            "validation": batches[0].validation if batches else None,
+            "derivations": {
+                name: [
+                    [list(derivation.task), derivation.replacements]
+                    for derivation in derived
+                ]
+                for name, derived in (derivations or {}).items()
+            },
+        }
+        helpers.write_atomic(
+            directory / "job.json",
+            json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+        )
+        return cls(jobs_dir, job_id)
+
+    @property
+    def derivations(self) -> dict[str, list[clustering.Derivation]]:
+        return {
+            name: [
+                clustering.Derivation(helpers.Task(*task), replacements)
+                for task, replacements in derived
+            ]
+            for name, derived in self.manifest.get("derivations", {}).items()
+        }
+
+    @property
+    def state(self) -> str:
+        return self.manifest["state"]
+
+    def _update(self, **fields: typing.Any) -> None:
+        self.manifest.update(fields)
+        helpers.write_atomic(
+            self.manifest_filename,
+            json.dumps(self.manifest, ensure_ascii=False).encode("utf-8"),
+        )
+
+    def submit(self, backend: Backend) -> None:
+        if self.state != "created":
+            return
+        self._update(
+            state="submitted", remote_id=backend.submit(self.requests_filename)
+        )
+
+    def poll(self, backend: Backend) -> str:
+        if self.state != "submitted":
+            return self.state
+        status = backend.status(self.manifest["remote_id"])
+        if status in FAILED_STATES:
+            self._update(state="failed")
+        elif status in FINISHED_STATES:
+            backend.download(self.manifest["remote_id"], self.results_filename)
+            self._update(state="finished")
+        return self.state
+
+    def wait(self, backend: Backend, poll_interval: float = 60.0) -> str:
+        while self.poll(backend) == "submitted":
+            time.sleep(poll_interval)
+        return self.state
+
+    def read_results(self) -> tuple[list[helpers.Phrase], int]:
+        results = {}
+        for line in open(self.results_filename, "rb"):
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                results[result["custom_id"]] = response["body"]
+
+        language_code = self.manifest["telegram_language_code"]
+        limits = self.manifest.get("validation")
+        phrases = []
+        missing = 0
+        for custom_id, tasks in self.manifest["batches"].items():
+            batch = translation.Batch(
+                [helpers.Task(*task) for task in tasks],
+                "",
+                (translation.Language(language_code, "", None),),
+                validation=(
+                    validation.Limits(*limits) if limits is not None else None
+                ),
+            )
+            with tracing.span("batch", batch.tasks[0].name):
+                completion = results.get(custom_id)
+                if completion is not None:
+                    chatgpt.record_usage(completion)
+                    content = completion["choices"][0]["message"]["content"]
+                    result = translation.parse_response(batch, content)
+                else:
+                    result = []
+                tracing.add("items", len(batch.tasks))
+                tracing.add("answered", len(result))
+            phrases.extend(
+                helpers.Phrase(answer.name, answer.texts[language_code])
+                for answer in result
+            )
+            missing += len(batch.tasks) - len(result)
+        return phrases, missing
+
+    def mark_ingested(self) -> None:
+        self._update(state="ingested")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--bulk", action="store_true")
+    parser.add_argument("--bulk_job_id", type=str, default=None)
+    parser.add_argument("--bulk_jobs_dir", type=Path, default=DEFAULT_JOBS_DIR)
+    parser.add_argument(
+        "--bulk_backend",
+        type=str,
+        choices=("openai", "local"),
+        default="openai",
+    )
+    parser.add_argument("--bulk_wait", action="store_true")
+    parser.add_argument("--bulk_poll_interval", type=float, default=60.0)
+
+
+def make_backend(
+    args: argparse.Namespace, chatgpt_client: chatgpt.ChatGpt
+) -> Backend:
+    if args.bulk_backend == "local":
+        return LocalBackend(args.bulk_jobs_dir / "local", chatgpt_client)
+    return OpenAiBackend(chatgpt_client.api_key, chatgpt_client.base_url)
@@ -1,20 +1,77 @@
+import asyncio
 import json
+import time
+import typing
 import urllib.request
 
+from . import http_pool
+from . import llm_cache
+from . import scheduler as scheduler_lib
+from . import tracing
+
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def estimate_tokens(text: str) -> int:
+    # Counted in characters: with UTF-8 bytes every Cyrillic letter counted
+    # twice and a full run was estimated at twice its actual usage.
+    return len(text) // 4 + 1
+
+
+class ApiError(Exception):
+    def __init__(
+        self, status: int, headers: dict[str, str], body: bytes
+    ) -> None:
+        super().__init__(
+            f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}"
+        )
+        self.status: int = status
+        self.headers: dict[str, str] = headers
+        self.body: bytes = body
+
+
+def record_usage(response: dict[str, typing.Any]) -> None:
+    usage = response.get("usage") or {}
+    tracing.add("prompt_tokens", usage.get("prompt_tokens", 0))
+    tracing.add("completion_tokens", usage.get("completion_tokens", 0))
+
 
 class ChatGpt:
-    def __init__(self, api_key: str) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        cache: llm_cache.ResponseCache | None = None,
+        model: str = "gpt-4o-2024-05-13",
+        seed: int = 0,
+        temperature: float = 0.1,
+        base_url: str = DEFAULT_BASE_URL,
+        timeout: float | None = None,
+    ) -> None:
         self.api_key: str = api_key
+        self.cache: llm_cache.ResponseCache | None = cache
+        self.model: str = model
+        self.seed: int = seed
+        self.temperature: float = temperature
+        self.base_url: str = base_url.rstrip("/")
+        self.timeout: float | None = timeout
         self.headers: dict[str, str] = {
             "Content-Type": "application/json; charset=utf-8",
             "Authorization": f"Bearer {self.api_key}",
         }
 
-    def get_response(self, prompt: str) -> str:
-        payload: dict[str, str] = {
-            "model": "gpt-4o-2024-05-13",
-            "seed": 0,
-            "temperature": 0.1,
+    def _cache_key(self, prompt: str) -> str | None:
+        if self.cache is None:
+            return None
+        return llm_cache.make_key(
+            self.model, self.seed, self.temperature, prompt
+        )
+
+    def _make_payload(self, prompt: str) -> dict[str, typing.Any]:
+        return {
+            "model": self.model,
+            "seed": self.seed,
+            "temperature": self.temperature,
             "messages": [
                 {
                     "role": "user",
@@ -28,13 +85,159 @@ class ChatGpt:
             ],
         }
 
+    def forget(self, prompt: str) -> None:
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None:
+            self.cache.discard(cache_key)
+
+    def get_response(self, prompt: str) -> str:
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                tracing.add("cache_hits", 1)
+                return cached
+
         request = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
+            f"{self.base_url}/chat/completions",
             headers=self.headers,
-            data=json.dumps(payload).encode("utf-8"),
+            data=json.dumps(self._make_payload(prompt)).encode("utf-8"),
         )
 
+        start = time.perf_counter()
         response = json.loads(
-            urllib.request.urlopen(request).read().decode("utf-8")
+            urllib.request.urlopen(request, timeout=self.timeout)
+            .read()
+            .decode("utf-8")
+        )
+        tracing.add("network_time", time.perf_counter() - start)
+        tracing.add("requests", 1)
+        record_usage(response)
+        content = response["choices"][0]["message"]["content"]
+
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+
+class AsyncChatGpt(ChatGpt):
+    def __init__(
+        self,
+        api_key: str,
+        cache: llm_cache.ResponseCache | None = None,
+        model: str = "gpt-4o-2024-05-13",
+        seed: int = 0,
+        temperature: float = 0.1,
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = 64,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        scheduler: scheduler_lib.Scheduler | None = None,
+    ) -> None:
+        super().__init__(
+            api_key,
+            cache=cache,
+            model=model,
+            seed=seed,
+            temperature=temperature,
+            base_url=base_url,
+            timeout=read_timeout,
+        )
+        self.pool: http_pool.ConnectionPool = http_pool.ConnectionPool(
+            self.base_url,
+            size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
+        self.scheduler: scheduler_lib.Scheduler = (
+            scheduler or scheduler_lib.Scheduler(initial_concurrency=pool_size)
         )
-        return response["choices"][0]["message"]["content"]
+
+    async def _post(self, body: bytes) -> str:
+        response = await self.pool.request(
+            "POST", "/chat/completions", headers=self.headers, body=body
+        )
+        if response.status != 200:
+            raise ApiError(response.status, response.headers, response.body)
+        completion = json.loads(response.body.decode("utf-8"))
+        record_usage(completion)
+        return completion["choices"][0]["message"]["content"]
+
+    async def get_response_async(self, prompt: str) -> str:
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                tracing.add("cache_hits", 1)
+                return cached
+
+        body = json.dumps(self._make_payload(prompt)).encode("utf-8")
+        content = await self.scheduler.run(
+            lambda: self._post(body), tokens=estimate_tokens(prompt)
+        )
+
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    async def _post_stream(
+        self, body: bytes, on_text: typing.Callable[[str], None]
+    ) -> str:
+        # Every attempt starts the answer over.
+        on_text("")
+        async with self.pool.stream(
+            "POST", "/chat/completions", headers=self.headers, body=body
+        ) as response:
+            if response.status != 200:
+                raise ApiError(
+                    response.status,
+                    response.headers,
+                    b"".join([chunk async for chunk in response.chunks]),
+                )
+            content = ""
+            buffer = b""
+            async for chunk in response.chunks:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        return content
+                    event = json.loads(data)
+                    if event.get("usage"):
+                        record_usage(event)
+                    for choice in event.get("choices", []):
+                        delta = choice["delta"].get("content")
+                        if delta:
+                            content += delta
+                            on_text(content)
+            raise asyncio.IncompleteReadError(b"", None)
+
+    async def stream_response_async(
+        self, prompt: str, on_text: typing.Callable[[str], None]
+    ) -> str:
+        cache_key = self._cache_key(prompt)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                tracing.add("cache_hits", 1)
+                on_text(cached)
+                return cached
+
+        payload = self._make_payload(prompt)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        body = json.dumps(payload).encode("utf-8")
+        content = await self.scheduler.run(
+            lambda: self._post_stream(body, on_text),
+            tokens=estimate_tokens(prompt),
+        )
+
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    async def close(self) -> None:
+        await self.pool.close()
@@ -0,0 +1,198 @@
+import re
+import typing
+
+from . import helpers
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PLACEHOLDER = re.compile(
+    r"%(?:\d+\$)?[-+ #0]*\d*(?:\.\d+)?(?:ll|l|h)?[sdifu@xXc]"
+    r"|\{[A-Za-z_]\w*\}|\{\d+\}|\bun\d\b"
+)
+PLURAL_SUFFIX = re.compile(
+    r"[_#](?:zero|one|two|few|many|other|any|\d+(?:_\d+)?)$"
+)
+
+NGRAM_SIZE = 3
+HASH_COUNT = 32
+BAND_COUNT = 8
+SIMILARITY_THRESHOLD = 0.6
+_HASH_SEED = 20240601
+
+
+class Derivation(typing.NamedTuple):
+    task: helpers.Task
+    replacements: dict[str, str]
+
+
+class Clustering(typing.NamedTuple):
+    groups: list[list[helpers.Task]]
+    derivations: dict[str, list[Derivation]]
+
+    @property
+    def tasks(self) -> list[helpers.Task]:
+        return [task for group in self.groups for task in group]
+
+    @property
+    def derived_count(self) -> int:
+        return sum(len(derived) for derived in self.derivations.values())
+
+
+def normalize(text: str) -> str:
+    return PLACEHOLDER.sub("\0", text)
+
+
+def make_derivation(
+    representative: helpers.Task, task: helpers.Task
+) -> Derivation | None:
+    replacements = {}
+    for old, new in zip(
+        PLACEHOLDER.findall(representative.text_ru),
+        PLACEHOLDER.findall(task.text_ru),
+    ):
+        if replacements.setdefault(old, new) != new:
+            return None
+    if len(set(replacements.values())) != len(replacements):
+        return None
+    return Derivation(task, replacements)
+
+
+def derive(text: str, derivation: Derivation) -> str | None:
+    found = set(PLACEHOLDER.findall(text))
+    # The answer has to keep exactly the placeholders of the source, or
+    # there is no safe way to rewrite them.
+    if found != set(derivation.replacements):
+        return None
+    return PLACEHOLDER.sub(
+        lambda match: derivation.replacements[match.group(0)], text
+    )
+
+
+def expand_phrases(
+    phrases: list[helpers.Phrase],
+    derivations: dict[str, list[Derivation]],
+) -> tuple[list[helpers.Phrase], int]:
+    result = list(phrases)
+    failed = 0
+    for phrase in phrases:
+        for derivation in derivations.get(phrase.name, []):
+            text = derive(phrase.text, derivation)
+            if text is None:
+                failed += 1
+            else:
+                result.append(helpers.Phrase(derivation.task.name, text))
+    return result, failed
+
+
+def _find(parents: list[int], i: int) -> int:
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def _union(parents: list[int], i: int, j: int) -> None:
+    i, j = _find(parents, i), _find(parents, j)
+    if i != j:
+        parents[max(i, j)] = min(i, j)
+
+
+def minhash_signatures(texts: list[str]) -> "np.ndarray":
+    lengths = np.array([max(len(text), 1) for text in texts], dtype=np.int64)
+    padding = "\1" * (NGRAM_SIZE - 1)
+    codes = np.frombuffer(
+        "".join((text or "\2") + padding for text in texts).encode(
+            "utf-32-le"
+        ),
+        dtype=np.uint32,
+    ).astype(np.uint64)
+
+    # Every text is followed by NGRAM_SIZE - 1 padding characters, so the
+    # n-grams starting inside a text never reach into the next one.
+    starts = np.zeros(len(texts), dtype=np.int64)
+    starts[1:] = np.cumsum(lengths + NGRAM_SIZE - 1)[:-1]
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    positions += np.arange(len(positions), dtype=np.int64)
+    grams = np.zeros(len(positions), dtype=np.uint64)
+    for offset in range(NGRAM_SIZE):
+        grams = grams * np.uint64(0x100000001B3) + codes[positions + offset]
+    gram_starts = np.zeros(len(texts), dtype=np.int64)
+    gram_starts[1:] = np.cumsum(lengths)[:-1]
+
+    random = np.random.default_rng(_HASH_SEED)
+    multipliers = random.integers(1, 2**63, HASH_COUNT, dtype=np.uint64) | 1
+    increments = random.integers(0, 2**63, HASH_COUNT, dtype=np.uint64)
+    signatures = np.empty((len(texts), HASH_COUNT), dtype=np.uint32)
+    for i in range(HASH_COUNT):
+        hashes = (grams * multipliers[i] + increments[i]) >> np.uint64(32)
+        signatures[:, i] = np.minimum.reduceat(hashes, gram_starts)
+    return signatures
+
+
+def _near_duplicate_pairs(texts: list[str]) -> list[tuple[int, int]]:
+    signatures = minhash_signatures(texts)
+    rows = HASH_COUNT // BAND_COUNT
+    weights = np.random.default_rng(_HASH_SEED + 1).integers(
+        1, 2**63, rows, dtype=np.uint64
+    )
+    pairs = []
+    for band in range(BAND_COUNT):
+        keys = (
+            signatures[:, band * rows : (band + 1) * rows].astype(np.uint64)
+            * weights
+        ).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        run_starts = np.flatnonzero(
+            np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        )
+        leaders = order[
+            np.repeat(run_starts, np.diff(np.r_[run_starts, len(order)]))
+        ]
+        similarity = (signatures[order] == signatures[leaders]).mean(axis=1)
+        matches = (order != leaders) & (similarity >= SIMILARITY_THRESHOLD)
+        pairs.extend(zip(leaders[matches].tolist(), order[matches].tolist()))
+    return pairs
+
+
+def cluster_tasks(tasks: list[helpers.Task]) -> Clustering:
+    representatives: dict[tuple[str, str], helpers.Task] = {}
+    derivations: dict[str, list[Derivation]] = {}
+    unique_tasks = []
+    for task in tasks:
+        key = (normalize(task.text_en), normalize(task.text_ru))
+        representative = representatives.get(key)
+        if representative is not None:
+            derivation = make_derivation(representative, task)
+            if derivation is not None:
+                derivations.setdefault(representative.name, []).append(
+                    derivation
+                )
+                continue
+        else:
+            representatives[key] = task
+        unique_tasks.append(task)
+
+    parents = list(range(len(unique_tasks)))
+    stems: dict[str, int] = {}
+    for i, task in enumerate(unique_tasks):
+        stem = PLURAL_SUFFIX.sub("", task.name)
+        if stem != task.name:
+            _union(parents, stems.setdefault(stem, i), i)
+    if np is not None and unique_tasks:
+        for i, j in _near_duplicate_pairs(
+            [
+                f"{normalize(task.text_en)}\3{normalize(task.text_ru)}"
+                for task in unique_tasks
+            ]
+        ):
+            _union(parents, i, j)
+
+    groups: dict[int, list[helpers.Task]] = {}
+    for i, task in enumerate(unique_tasks):
+        groups.setdefault(_find(parents, i), []).append(task)
+    return Clustering(list(groups.values()), derivations)
@@ -1,3 +1,4 @@
+import functools
 import typing
 
 
@@ -127,3 +128,24 @@ def get_language_name(iso_language_code: str) -> str:
         return "Tatar"
 
     raise ValueError(f"Unsupported language code: {iso_language_code}")
+
+
+@functools.lru_cache
+def merge_dictionaries(dictionaries: tuple[Dictionary, ...]) -> Dictionary:
+    # Snippets of several languages are merged by their source texts, so the
+    # target column lists one translation per language, "?" when missing.
+    if len(dictionaries) == 1:
+        return dictionaries[0]
+    targets: dict[tuple[str, str], list[str]] = {}
+    for i, dictionary in enumerate(dictionaries):
+        for snippet in dictionary.snippets:
+            texts = targets.setdefault(
+                (snippet.en, snippet.ru), ["?"] * len(dictionaries)
+            )
+            texts[i] = snippet.target
+    return Dictionary(
+        snippets=tuple(
+            Snippet(en, ru, " - ".join(texts))
+            for (en, ru), texts in targets.items()
+        )
+    )
@@ -0,0 +1,118 @@
+import functools
+import typing
+
+from . import dictionaries
+
+
+# Enough for every task of a full run, while a long-lived daemon only keeps
+# the most recently matched ones.
+MATCH_CACHE_SIZE = 1 << 16
+
+
+class Automaton:
+    def __init__(
+        self, patterns: typing.Iterable[str], word_boundary: bool = False
+    ) -> None:
+        self.word_boundary: bool = word_boundary
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.outputs: list[list[tuple[int, int]]] = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append((pattern_id, len(pattern)))
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.outputs[next_state] = (
+                    self.outputs[next_state]
+                    + self.outputs[self.fail[next_state]]
+                )
+
+    def find(self, text: str) -> set[int]:
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        text = text.lower()
+        found = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not outputs[state]:
+                continue
+            for pattern_id, length in outputs[state]:
+                start = position - length + 1
+                # Only the start is anchored so that inflected forms still
+                # match their dictionary stem.
+                if (
+                    self.word_boundary
+                    and start > 0
+                    and (text[start - 1].isalnum() or text[start - 1] == "_")
+                ):
+                    continue
+                found.add(pattern_id)
+
+        return found
+
+
+class Matcher:
+    def __init__(
+        self, dictionary: dictionaries.Dictionary, word_boundary: bool = False
+    ) -> None:
+        self.snippets: tuple[dictionaries.Snippet] = dictionary.snippets
+        self.automaton_en: Automaton = Automaton(
+            (snippet.en for snippet in dictionary.snippets), word_boundary
+        )
+        self.automaton_ru: Automaton = Automaton(
+            (snippet.ru for snippet in dictionary.snippets), word_boundary
+        )
+        # Tasks are matched when planning batches and again in their prompt.
+        self.match_ids: typing.Callable[[str, str], frozenset[int]] = (
+            functools.lru_cache(MATCH_CACHE_SIZE)(self._match_ids)
+        )
+
+    def _match_ids(self, text_en: str, text_ru: str) -> frozenset[int]:
+        return frozenset(
+            self.automaton_en.find(text_en) | self.automaton_ru.find(text_ru)
+        )
+
+    def match(self, text_en: str, text_ru: str) -> list[dictionaries.Snippet]:
+        return [
+            self.snippets[snippet_id]
+            for snippet_id in sorted(self.match_ids(text_en, text_ru))
+        ]
+
+
+_matchers: dict[tuple[int, bool], tuple[dictionaries.Dictionary, Matcher]] = {}
+
+
+def get_matcher(
+    dictionary: dictionaries.Dictionary, word_boundary: bool = False
+) -> Matcher:
+    key = (id(dictionary), word_boundary)
+    cached = _matchers.get(key)
+    if cached is None or cached[0] is not dictionary:
+        cached = (dictionary, Matcher(dictionary, word_boundary))
+        _matchers[key] = cached
+    return cached[1]
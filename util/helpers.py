@@ -1,15 +1,31 @@
+import hashlib
 import json
+import os
 import pathlib
-import re
+import threading
 import typing
 
-import bs4
-
 from . import dictionaries
+from . import parsers
+from . import phrase_cache
+from . import phrase_table
+from . import tracing
 
 
 Path = pathlib.Path
 
+PLATFORMS = (
+    "android",
+    "android_x",
+    "tdesktop",
+    "ios",
+    "macos",
+    "weba",
+    "webk",
+    "unigram",
+)
+XML_PLATFORMS = ("android", "android_x", "unigram")
+
 
 class Phrase(typing.NamedTuple):
     name: str
@@ -22,26 +38,152 @@ class Task(typing.NamedTuple):
     text_ru: str
 
 
+def write_atomic(filename: Path, data: bytes | typing.Iterable[bytes]) -> None:
+    # Readers see either the old file or the complete new one, even after a
+    # crash, and concurrent writers never share a temporary file.
+    tmp_filename = filename.with_name(
+        f".{filename.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        with open(tmp_filename, "wb") as output:
+            if isinstance(data, bytes):
+                output.write(data)
+            else:
+                output.writelines(data)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        tmp_filename.unlink(missing_ok=True)
+        raise
+
+
 class Snapshot:
     def __init__(
-        self, snapshots_dir: Path, language_code: str, platform: str
+        self,
+        snapshots_dir: Path,
+        language_code: str,
+        platform: str,
+        compact_threshold: int = 8 * 1024 * 1024,
     ) -> None:
         self.filename: Path = (
             snapshots_dir / language_code / platform
         ).with_suffix(".json")
+        self.journal_filename: Path = self.filename.with_suffix(".journal")
+        self.sources_filename: Path = self.filename.with_suffix(
+            ".sources.json"
+        )
+        self.compact_threshold: int = compact_threshold
         self.phrases: dict[str, str] = json.loads(
             open(self.filename, "rb").read().decode("utf-8")
         )
+        self.sources: dict[str, str] = {}
+        if self.sources_filename.exists():
+            self.sources = json.loads(
+                open(self.sources_filename, "rb").read().decode("utf-8")
+            )
+        self.pending: dict[str, str | None] = {}
+        self.pending_sources: dict[str, str | None] = {}
+        # Size of the journal up to its last complete record.
+        self.journal_size: int = 0
+        self._replay_journal()
+
+    @staticmethod
+    def _apply(
+        target: dict[str, str], updates: dict[str, str | None]
+    ) -> None:
+        for name, value in updates.items():
+            if value is None:
+                target.pop(name, None)
+            else:
+                target[name] = value
+
+    def _replay_journal(self) -> None:
+        try:
+            journal = open(self.journal_filename, "rb")
+        except FileNotFoundError:
+            return
+        with journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self._apply(self.phrases, record["phrases"])
+                self._apply(self.sources, record.get("sources", {}))
+                self.journal_size += len(line)
 
     def save(self) -> None:
-        open(self.filename, "wb").write(
+        if not self.pending and not self.pending_sources:
+            return
+        with tracing.span("snapshot_save", str(self.filename)):
+            line = (
+                json.dumps(
+                    {"phrases": self.pending, "sources": self.pending_sources},
+                    ensure_ascii=False,
+                ).encode("utf-8")
+                + b"\n"
+            )
+            with open(self.journal_filename, "ab") as journal:
+                # Only the writer drops a record torn by a crash in the middle
+                # of an append; readers may race with an append in progress.
+                if journal.tell() != self.journal_size:
+                    journal.truncate(self.journal_size)
+                journal.write(line)
+                journal.flush()
+                os.fsync(journal.fileno())
+                self.journal_size = journal.tell()
+            tracing.add("phrases", len(self.pending))
+            tracing.add("bytes", len(line))
+            self.pending = {}
+            self.pending_sources = {}
+
+            if self.journal_size > self.compact_threshold:
+                tracing.add("compactions", 1)
+                self.compact()
+
+    @staticmethod
+    def _write_json(filename: Path, data: dict[str, str]) -> None:
+        write_atomic(
+            filename,
             json.dumps(
-                self.phrases, indent=2, ensure_ascii=False, sort_keys=True
-            ).encode("utf-8")
+                data, indent=2, ensure_ascii=False, sort_keys=True
+            ).encode("utf-8"),
         )
 
-    def update_phrase(self, phrase: Phrase) -> None:
+    def compact(self) -> None:
+        self._write_json(self.filename, self.phrases)
+        if self.sources or self.sources_filename.exists():
+            self._write_json(self.sources_filename, self.sources)
+        self.journal_filename.unlink(missing_ok=True)
+        self.journal_size = 0
+        self.pending = {}
+        self.pending_sources = {}
+
+    def close(self) -> None:
+        self.save()
+        if self.journal_filename.exists():
+            self.compact()
+
+    def update_phrase(
+        self, phrase: Phrase, source_hash: str | None = None
+    ) -> None:
         self.phrases[phrase.name] = phrase.text
+        self.pending[phrase.name] = phrase.text
+        if source_hash is not None:
+            self.set_source_hash(phrase.name, source_hash)
+
+    def set_source_hash(self, name: str, source_hash: str) -> None:
+        self.sources[name] = source_hash
+        self.pending_sources[name] = source_hash
+
+    def remove_phrase(self, name: str) -> None:
+        self.phrases.pop(name, None)
+        self.sources.pop(name, None)
+        self.pending[name] = None
+        self.pending_sources[name] = None
 
     def get_phrase(self, name: str) -> Phrase:
         return Phrase(name, self.phrases[name])
@@ -51,13 +193,9 @@ class Snapshot:
 
 
 def parse_xml(filename: Path) -> list[Phrase]:
-    data = open(filename, "rb").read().decode("utf-8")
-    soup = bs4.BeautifulSoup(data, features="xml")
     res = []
     keys = set()
-    for entry in soup.select("resources > string"):
-        name = entry.attrs["name"]
-        text = entry.text
+    for name, text in parsers.iter_xml(filename):
         assert text.find('"""') == -1
         if name in keys:
             print("Problematic key: " + name)
@@ -69,14 +207,8 @@ def parse_xml(filename: Path) -> list[Phrase]:
 
 
 def parse_strings(filename: Path) -> list[Phrase]:
-    lines = open(filename, "rb").read().decode("utf-8").splitlines()
     res = {}
-    for line in lines:
-        m = re.search(r'^\s*"([^"]+)"\s*=\s*"(.+)"', line)
-        if not m:
-            continue
-        name = m.group(1)
-        text = m.group(2)
+    for name, text in parsers.iter_strings(filename):
         assert text.find('"""') == -1
         if res.get(name, text) != text:
             print("Problematic key: " + name)
@@ -86,55 +218,126 @@ def parse_strings(filename: Path) -> list[Phrase]:
     return [Phrase(name, text) for name, text in res.items()]
 
 
-def load_phrases(
+def phrases_filename(
     base_path: Path, language_code: str, platform: str
-) -> list[Phrase]:
+) -> Path:
     file_basename: Path = base_path / language_code / platform
-    if platform in ("android", "android_x", "unigram"):
-        return parse_xml(file_basename.with_suffix(".xml"))
-    else:
-        return parse_strings(file_basename.with_suffix(".strings"))
-
+    if platform in XML_PLATFORMS:
+        return file_basename.with_suffix(".xml")
+    return file_basename.with_suffix(".strings")
 
-def load_tasks(defaults_dir: Path, platform: str) -> list[Task]:
-    phrases_en: list[Phrase] = load_phrases(defaults_dir, "en", platform)
-    phrases_ru: list[Phrase] = load_phrases(defaults_dir, "ru", platform)
 
-    dict_ru = {phrase.name: phrase for phrase in phrases_ru}
-    tasks = []
-    for phrase_en in phrases_en:
-        if phrase_en.name not in dict_ru:
-            continue
-        phrase_ru = dict_ru[phrase_en.name]
-        tasks.append(Task(phrase_en.name, phrase_en.text, phrase_ru.text))
+def load_entries(
+    base_path: Path,
+    language_code: str,
+    platform: str,
+    cache: phrase_cache.PhraseCache | None = None,
+) -> list[tuple[str, str]]:
+    filename = phrases_filename(base_path, language_code, platform)
+    parse = parse_xml if platform in XML_PLATFORMS else parse_strings
 
-    return tasks
+    if cache is None:
+        return parse(filename)
+    return cache.load(filename, parse)
 
 
-def select_modified(
-    phrases: list[Phrase], base_phrases: list[Phrase]
+def load_phrases(
+    base_path: Path,
+    language_code: str,
+    platform: str,
+    cache: phrase_cache.PhraseCache | None = None,
 ) -> list[Phrase]:
-    base_phrases_dict = {phrase.name: phrase for phrase in base_phrases}
-    assert all(phrase.name in base_phrases_dict for phrase in phrases)
     return [
-        phrase
-        for phrase in phrases
-        if phrase.text != base_phrases_dict[phrase.name].text
+        Phrase(name, text)
+        for name, text in load_entries(
+            base_path, language_code, platform, cache
+        )
     ]
 
 
-def merge_translations(
-    default_phrases: list[Phrase], manual_phrases: list[Phrase]
-) -> list[Phrase]:
-    result = {}
-    manual_phrases_dict = {phrase.name: phrase for phrase in manual_phrases}
-    for phrase in default_phrases:
-        if phrase.name in manual_phrases_dict:
-            result[phrase.name] = manual_phrases_dict[phrase.name]
+def load_sources(
+    defaults_dir: Path,
+    platform: str,
+    cache: phrase_cache.PhraseCache | None = None,
+) -> phrase_table.PhraseTable:
+    table = phrase_table.PhraseTable()
+    for language_code in ("en", "ru"):
+        table.add(
+            language_code,
+            load_entries(defaults_dir, language_code, platform, cache),
+        )
+    return table
+
+
+def load_tasks(
+    defaults_dir: Path,
+    platform: str,
+    cache: phrase_cache.PhraseCache | None = None,
+) -> list[Task]:
+    table = load_sources(defaults_dir, platform, cache)
+    return [Task(*row) for row in table.join("en", "ru")]
+
+
+def source_names(table: phrase_table.PhraseTable) -> set[str]:
+    return {name for column in ("en", "ru") for name, _ in table.items(column)}
+
+
+class TaskDiff(typing.NamedTuple):
+    new: list[Task]
+    changed: list[Task]
+    unchanged: list[Task]
+    unknown: list[Task]
+    deleted: list[str]
+
+
+def source_hash(task: Task) -> str:
+    return hashlib.sha256(
+        f"{task.text_en}\0{task.text_ru}".encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def diff_tasks(
+    tasks: list[Task], snapshot: Snapshot, names: set[str]
+) -> TaskDiff:
+    # A key is deleted only when it is gone from both sources; one missing
+    # from only one of them has no task but keeps its translation.
+    diff = TaskDiff([], [], [], [], [])
+    for task in tasks:
+        if task.name not in snapshot:
+            diff.new.append(task)
+            continue
+        recorded_hash = snapshot.sources.get(task.name)
+        if recorded_hash is None:
+            diff.unknown.append(task)
+        elif recorded_hash != source_hash(task):
+            diff.changed.append(task)
         else:
-            result[phrase.name] = phrase
+            diff.unchanged.append(task)
+    diff.deleted.extend(
+        sorted(name for name in snapshot.phrases if name not in names)
+    )
 
-    return list(result.values())
+    return diff
+
+
+def deduplicate_tasks(
+    tasks_by_platform: dict[str, list[Task]],
+) -> tuple[list[Task], dict[str, list[tuple[str, str]]]]:
+    unique_tasks: dict[tuple[str, str], Task] = {}
+    targets: dict[str, list[tuple[str, str]]] = {}
+    for platform, tasks in tasks_by_platform.items():
+        for task in tasks:
+            key = (task.text_en, task.text_ru)
+            unique_task = unique_tasks.get(key)
+            if unique_task is None:
+                unique_task = Task(
+                    f"{platform}/{task.name}", task.text_en, task.text_ru
+                )
+                unique_tasks[key] = unique_task
+                targets[unique_task.name] = []
+            targets[unique_task.name].append((platform, task.name))
+
+    return list(unique_tasks.values()), targets
 
 
 def format_snippets(snippets: dictionaries.Snippet) -> str:
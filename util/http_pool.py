@@ -0,0 +1,244 @@
+import asyncio
+import collections
+import contextlib
+import ssl
+import typing
+import urllib.parse
+
+
+# Responses that never carry a body, whatever their headers say.
+NO_BODY_STATUSES = (204, 304)
+
+
+class HttpResponse(typing.NamedTuple):
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+
+class StreamingResponse(typing.NamedTuple):
+    status: int
+    headers: dict[str, str]
+    chunks: typing.AsyncIterator[bytes]
+
+
+class Connection(typing.NamedTuple):
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        base_url: str,
+        size: int = 16,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+    ) -> None:
+        url = urllib.parse.urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {base_url}")
+        self.host: str = url.hostname
+        self.port: int = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl: ssl.SSLContext | None = (
+            ssl.create_default_context() if url.scheme == "https" else None
+        )
+        self.base_path: str = url.path.rstrip("/")
+        self.host_header: str = url.netloc
+        self.size: int = size
+        self.connect_timeout: float = connect_timeout
+        self.read_timeout: float = read_timeout
+        self.idle: collections.deque[Connection] = collections.deque()
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(size)
+        self.opened: int = 0
+
+    async def _connect(self) -> Connection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl,
+                server_hostname=self.host if self.ssl else None,
+            ),
+            self.connect_timeout,
+        )
+        self.opened += 1
+        return Connection(reader, writer)
+
+    def _take_idle(self) -> Connection | None:
+        while self.idle:
+            connection = self.idle.pop()
+            if not connection.reader.at_eof():
+                return connection
+            connection.writer.close()
+        return None
+
+    def _encode_request(
+        self, method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> bytes:
+        lines = [
+            f"{method} {self.base_path}{path} HTTP/1.1",
+            f"Host: {self.host_header}",
+            f"Content-Length: {len(body)}",
+            "Connection: keep-alive",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    async def _read_head(
+        self, connection: Connection
+    ) -> tuple[int, dict[str, str]]:
+        head = await connection.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = (
+            head.decode("latin-1").rstrip("\r\n").split("\r\n")
+        )
+        status = int(status_line.split(" ", 2)[1])
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _read_chunks(
+        self, connection: Connection, status: int, headers: dict[str, str]
+    ) -> typing.AsyncIterator[bytes]:
+        reader = connection.reader
+        if status in NO_BODY_STATUSES:
+            return
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                size = int(size_line.split(b";", 1)[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    return
+                chunk = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield chunk
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, 1 << 16))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            headers["connection"] = "close"
+            while chunk := await reader.read(1 << 16):
+                yield chunk
+
+    async def _open(
+        self, request: bytes
+    ) -> tuple[Connection, int, dict[str, str]]:
+        connection = self._take_idle()
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = await self._connect()
+            try:
+                connection.writer.write(request)
+                await connection.writer.drain()
+                status, headers = await asyncio.wait_for(
+                    self._read_head(connection), self.read_timeout
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.writer.close()
+                if not reused:
+                    raise
+                # A keep-alive connection may have been closed by the
+                # server while idle, so retry once on a fresh one.
+                connection = None
+                reused = False
+                continue
+            except BaseException:
+                connection.writer.close()
+                raise
+            return connection, status, headers
+
+    def _release(
+        self, connection: Connection, headers: dict[str, str]
+    ) -> None:
+        if headers.get("connection", "").lower() == "close":
+            connection.writer.close()
+        else:
+            self.idle.append(connection)
+
+    async def _read_body(
+        self, connection: Connection, status: int, headers: dict[str, str]
+    ) -> bytes:
+        return b"".join(
+            [
+                chunk
+                async for chunk in self._read_chunks(
+                    connection, status, headers
+                )
+            ]
+        )
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str] | None = None,
+        body: bytes = b"",
+    ) -> HttpResponse:
+        request = self._encode_request(method, path, headers or {}, body)
+        async with self.semaphore:
+            connection, status, response_headers = await self._open(request)
+            try:
+                response_body = await asyncio.wait_for(
+                    self._read_body(connection, status, response_headers),
+                    self.read_timeout,
+                )
+            except BaseException:
+                connection.writer.close()
+                raise
+            self._release(connection, response_headers)
+            return HttpResponse(status, response_headers, response_body)
+
+    async def _with_timeout(
+        self, chunks: typing.AsyncIterator[bytes]
+    ) -> typing.AsyncIterator[bytes]:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(
+                    anext(chunks), self.read_timeout
+                )
+            except StopAsyncIteration:
+                return
+            yield chunk
+
+    @contextlib.asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str] | None = None,
+        body: bytes = b"",
+    ) -> typing.AsyncIterator[StreamingResponse]:
+        request = self._encode_request(method, path, headers or {}, body)
+        async with self.semaphore:
+            connection, status, response_headers = await self._open(request)
+            # While streaming, the read timeout applies to every chunk
+            # rather than to the whole body.
+            chunks = self._with_timeout(
+                self._read_chunks(connection, status, response_headers)
+            )
+            try:
+                yield StreamingResponse(status, response_headers, chunks)
+                async for _ in chunks:
+                    pass
+            except BaseException:
+                connection.writer.close()
+                raise
+            self._release(connection, response_headers)
+
+    async def close(self) -> None:
+        while self.idle:
+            connection = self.idle.pop()
+            connection.writer.close()
+            try:
+                await connection.writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
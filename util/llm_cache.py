@@ -0,0 +1,137 @@
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+from . import helpers
+
+
+Path = pathlib.Path
+
+DEFAULT_CACHE_FILENAME: Path = (
+    Path(__file__).resolve().parent.parent
+    / ".cache"
+    / "llm"
+    / "responses.jsonl"
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def make_key(model: str, seed: int, temperature: float, prompt: str) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            [model, seed, temperature, prompt], ensure_ascii=False
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self, filename: Path, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.filename: Path = filename
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.responses: dict[str, str] = {}
+        self.size: int = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            source = open(self.filename, "rb")
+        except FileNotFoundError:
+            return
+        with source:
+            for line in source:
+                if not line.endswith(b"\n"):
+                    # Torn by a crash in the middle of an append; the next
+                    # record would be glued onto it.
+                    os.truncate(self.filename, self.size)
+                    break
+                self.size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.responses.pop(record["key"], None)
+                if record["response"] is not None:
+                    self.responses[record["key"]] = record["response"]
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            response = self.responses.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, key: str, response: str | None) -> None:
+        line = (
+            json.dumps(
+                {"key": key, "response": response}, ensure_ascii=False
+            ).encode("utf-8")
+            + b"\n"
+        )
+        with self.lock:
+            self.responses.pop(key, None)
+            if response is not None:
+                self.responses[key] = response
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.filename, "ab") as output:
+                output.write(line)
+            self.size += len(line)
+            if self.size > self.max_bytes:
+                self._compact()
+
+    def discard(self, key: str) -> None:
+        with self.lock:
+            if key not in self.responses:
+                return
+        self.put(key, None)
+
+    def _compact(self) -> None:
+        lines = []
+        size = 0
+        for key, response in reversed(self.responses.items()):
+            line = (
+                json.dumps(
+                    {"key": key, "response": response}, ensure_ascii=False
+                ).encode("utf-8")
+                + b"\n"
+            )
+            if size + len(line) > self.max_bytes // 2:
+                break
+            lines.append(line)
+            size += len(line)
+        lines.reverse()
+
+        helpers.write_atomic(self.filename, lines)
+
+        self.responses = dict(
+            list(self.responses.items())[len(self.responses) - len(lines) :]
+        )
+        self.size = size
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--llm_cache_filename", type=Path, default=DEFAULT_CACHE_FILENAME
+    )
+    parser.add_argument(
+        "--llm_cache_max_bytes", type=int, default=DEFAULT_MAX_BYTES
+    )
+    parser.add_argument("--no_llm_cache", action="store_true")
+    parser.add_argument("--clear_llm_cache", action="store_true")
+
+
+def from_args(args: argparse.Namespace) -> ResponseCache | None:
+    if args.clear_llm_cache:
+        args.llm_cache_filename.unlink(missing_ok=True)
+    if args.no_llm_cache:
+        return None
+    return ResponseCache(args.llm_cache_filename, args.llm_cache_max_bytes)
@@ -0,0 +1,216 @@
+import collections
+import itertools
+import pathlib
+import typing
+
+from . import clustering
+from . import helpers
+from . import phrase_cache
+
+
+Path = pathlib.Path
+
+NGRAM_SIZE = 3
+# Only the rarest n-grams of a query are looked up in the postings; the
+# candidates they produce are then scored on all n-grams.
+QUERY_NGRAM_COUNT = 12
+MAX_SCANNED_POSTINGS = 1000
+CANDIDATE_COUNT = 6
+MAX_BATCH_EXAMPLES = 16
+
+MEMORY_HEADER = (
+    "Here are similar text strings that have already been translated into"
+    " {language_name}. Keep your translations consistent with them:"
+)
+
+
+class Entry(typing.NamedTuple):
+    text_en: str
+    text_ru: str
+    text: str
+
+
+class Match(typing.NamedTuple):
+    score: float
+    entry: Entry
+
+
+def _fuzzy_key(text_en: str, text_ru: str) -> str:
+    return f"{clustering.normalize(text_en)}\3{clustering.normalize(text_ru)}"
+
+
+def _ngrams(key: str) -> set[tuple[str, ...]]:
+    key = f" {key.lower()} "
+    return set(zip(*(key[i:] for i in range(NGRAM_SIZE))))
+
+
+class TranslationMemory:
+    def __init__(self, top_k: int = 2, threshold: float = 0.6) -> None:
+        self.top_k: int = top_k
+        self.threshold: float = threshold
+        self.entries: list[Entry] = []
+        self.exact: dict[tuple[str, str], int] = {}
+        self.normalized: dict[tuple[str, str], int] = {}
+        self.postings: dict[tuple[str, ...], list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, task: helpers.Task, text: str) -> None:
+        key = (task.text_en, task.text_ru)
+        if key in self.exact:
+            return
+        entry_id = len(self.entries)
+        self.entries.append(Entry(task.text_en, task.text_ru, text))
+        self.exact[key] = entry_id
+        self.normalized.setdefault(
+            (
+                clustering.normalize(task.text_en),
+                clustering.normalize(task.text_ru),
+            ),
+            entry_id,
+        )
+        for gram in _ngrams(_fuzzy_key(task.text_en, task.text_ru)):
+            self.postings.setdefault(gram, []).append(entry_id)
+
+    def lookup(self, task: helpers.Task) -> str | None:
+        entry_id = self.exact.get((task.text_en, task.text_ru))
+        if entry_id is not None:
+            return self.entries[entry_id].text
+
+        entry_id = self.normalized.get(
+            (
+                clustering.normalize(task.text_en),
+                clustering.normalize(task.text_ru),
+            )
+        )
+        if entry_id is None:
+            return None
+        entry = self.entries[entry_id]
+        derivation = clustering.make_derivation(
+            helpers.Task("", entry.text_en, entry.text_ru), task
+        )
+        if derivation is None:
+            return None
+        return clustering.derive(entry.text, derivation)
+
+    def search(self, task: helpers.Task) -> list[Match]:
+        if self.top_k <= 0:
+            return []
+        grams = _ngrams(_fuzzy_key(task.text_en, task.text_ru))
+        postings = sorted(
+            (self.postings[gram] for gram in grams if gram in self.postings),
+            key=len,
+        )
+        budget = MAX_SCANNED_POSTINGS
+        selected = []
+        for posting in postings[:QUERY_NGRAM_COUNT]:
+            if selected and len(posting) > budget:
+                break
+            selected.append(posting)
+            budget -= len(posting)
+        counts = collections.Counter(itertools.chain.from_iterable(selected))
+
+        matches = []
+        for entry_id, _ in counts.most_common(CANDIDATE_COUNT):
+            entry = self.entries[entry_id]
+            if (entry.text_en, entry.text_ru) == (task.text_en, task.text_ru):
+                continue
+            entry_grams = _ngrams(_fuzzy_key(entry.text_en, entry.text_ru))
+            score = (
+                2 * len(grams & entry_grams) / (len(grams) + len(entry_grams))
+            )
+            if score >= self.threshold:
+                matches.append(Match(score, entry))
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[: self.top_k]
+
+
+def format_entries(entries: list[Entry]) -> str:
+    lines = []
+    for entry in entries:
+        lines.append(f'"""{entry.text_en}"""')
+        lines.append(f'"""{entry.text_ru}"""')
+        lines.append(f'"""{entry.text}"""')
+        lines.append("")
+    return "\n".join(lines)
+
+
+def format_memory(entries: list[Entry], language_name: str) -> str:
+    if not entries:
+        return ""
+    return (
+        MEMORY_HEADER.format(language_name=language_name)
+        + "\n\n"
+        + format_entries(entries)
+        + "\n\n"
+    )
+
+
+def add_platform(
+    memory: TranslationMemory,
+    tasks: dict[str, helpers.Task],
+    canonical: typing.Iterable[tuple[str, str]],
+    snapshot: helpers.Snapshot | None,
+) -> None:
+    # Human translations take precedence over earlier LLM answers.
+    for name, text in canonical:
+        task = tasks.get(name)
+        if task is not None and text != task.text_ru:
+            memory.add(task, text)
+
+    if snapshot is None:
+        return
+    for name, text in snapshot.phrases.items():
+        task = tasks.get(name)
+        if task is None:
+            continue
+        recorded_hash = snapshot.sources.get(name)
+        if recorded_hash is not None and recorded_hash != (
+            helpers.source_hash(task)
+        ):
+            continue
+        memory.add(task, text)
+
+
+def build_memory(
+    defaults_dir: Path,
+    snapshots_dir: Path,
+    telegram_language_code: str,
+    canonical_data_dir: Path | None = None,
+    canonical_language_code: str | None = None,
+    cache: phrase_cache.PhraseCache | None = None,
+    snapshots: dict[str, helpers.Snapshot] | None = None,
+    top_k: int = 2,
+    threshold: float = 0.6,
+) -> TranslationMemory:
+    memory = TranslationMemory(top_k, threshold)
+    snapshots = snapshots or {}
+    for platform in helpers.PLATFORMS:
+        tasks = {
+            task.name: task
+            for task in helpers.load_tasks(defaults_dir, platform, cache)
+        }
+
+        canonical = []
+        if canonical_data_dir is not None and (
+            helpers.phrases_filename(
+                canonical_data_dir, canonical_language_code, platform
+            ).exists()
+        ):
+            canonical = helpers.load_entries(
+                canonical_data_dir, canonical_language_code, platform, cache
+            )
+
+        snapshot = snapshots.get(platform)
+        if snapshot is None:
+            filename = (
+                snapshots_dir / telegram_language_code / platform
+            ).with_suffix(".json")
+            if filename.exists():
+                snapshot = helpers.Snapshot(
+                    snapshots_dir, telegram_language_code, platform
+                )
+        add_platform(memory, tasks, canonical, snapshot)
+
+    return memory
@@ -0,0 +1,56 @@
+import pathlib
+import re
+import typing
+import xml.etree.ElementTree as ElementTree
+
+
+Path = pathlib.Path
+
+
+class Entry(typing.NamedTuple):
+    name: str
+    text: str
+
+
+_STRINGS_TOKEN = re.compile(
+    r"//[^\n]*"
+    r"|/\*.*?\*/"
+    r'|"([^"\\\n]*(?:\\.[^"\\\n]*)*)"\s*=\s*"([^"\\]*(?:\\.[^"\\]*)*)"',
+    re.DOTALL,
+)
+
+
+def iter_xml(filename: Path) -> typing.Iterator[Entry]:
+    with open(filename, "rb") as source:
+        if not source.peek(1):
+            return
+        depth = 0
+        root = None
+        for event, element in ElementTree.iterparse(
+            source, events=("start", "end")
+        ):
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if root.tag == "resources" and element.tag == "string":
+                yield Entry(
+                    element.attrib["name"], "".join(element.itertext())
+                )
+            root.remove(element)
+
+
+def iter_strings(filename: Path) -> typing.Iterator[Entry]:
+    data = open(filename, "rb").read().decode("utf-8")
+    for match in _STRINGS_TOKEN.finditer(data):
+        name, text = match.groups()
+        # Values spanning several lines are matched so their lines are not
+        # taken for entries, but skipped like the line-based parser did: the
+        # dumps redefine such keys on a single line.
+        if not name or not text or "\n" in text:
+            continue
+        yield Entry(name, text)
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import marshal
+import pathlib
+import shutil
+import time
+import typing
+
+
+Path = pathlib.Path
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR: Path = (
+    Path(__file__).resolve().parent.parent / ".cache" / "phrases"
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+Entries = list[tuple[str, str]]
+
+
+def _hash_file(filename: Path) -> str:
+    digest = hashlib.sha256(CACHE_VERSION.to_bytes(4, "little"))
+    with open(filename, "rb") as source:
+        for chunk in iter(lambda: source.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PhraseCache:
+    def __init__(
+        self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.cache_dir: Path = cache_dir
+        self.max_bytes: int = max_bytes
+        self.index_filename: Path = cache_dir / "index.json"
+        self.hits: int = 0
+        self.misses: int = 0
+        self.index: dict[str, dict[str, typing.Any]] = self._read_index()
+
+    def _read_index(self) -> dict[str, dict[str, typing.Any]]:
+        try:
+            index = json.loads(open(self.index_filename, "rb").read())
+        except (FileNotFoundError, ValueError):
+            return {}
+        if index.get("version") != CACHE_VERSION:
+            return {}
+        return index["files"]
+
+    def _write_index(self) -> None:
+        # helpers imports this module, so it is only imported when needed.
+        from . import helpers
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        helpers.write_atomic(
+            self.index_filename,
+            json.dumps({"version": CACHE_VERSION, "files": self.index}).encode(
+                "utf-8"
+            ),
+        )
+
+    def _entry_filename(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}.bin"
+
+    def _read_entry(self, content_hash: str) -> Entries | None:
+        try:
+            names, texts = marshal.loads(
+                open(self._entry_filename(content_hash), "rb").read()
+            )
+        except (FileNotFoundError, EOFError, ValueError, TypeError):
+            return None
+        return list(zip(names, texts))
+
+    def load(
+        self, filename: Path, parse: typing.Callable[[Path], Entries]
+    ) -> Entries:
+        key = str(filename.resolve())
+        stat = filename.stat()
+        record = self.index.get(key)
+
+        content_hash = None
+        changed = (
+            record is None
+            or record["size"] != stat.st_size
+            or record["mtime_ns"] != stat.st_mtime_ns
+        )
+        if changed:
+            content_hash = _hash_file(filename)
+            if record is not None and record["hash"] != content_hash:
+                record = None
+
+        entries = None
+        if record is not None:
+            entries = self._read_entry(record["hash"])
+
+        if entries is None:
+            self.misses += 1
+            entries = [(name, text) for name, text in parse(filename)]
+            content_hash = content_hash or _hash_file(filename)
+            data = marshal.dumps(
+                (
+                    tuple(name for name, _ in entries),
+                    tuple(text for _, text in entries),
+                )
+            )
+            from . import helpers
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            helpers.write_atomic(self._entry_filename(content_hash), data)
+            record = {"hash": content_hash, "bytes": len(data)}
+            added = True
+        else:
+            self.hits += 1
+            added = False
+
+        record.update(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            atime=time.time(),
+        )
+        self.index[key] = record
+        # A warm run only bumps access times in memory, which are written
+        # with the next change, so eviction order is only roughly LRU.
+        if added:
+            self._evict()
+        if added or changed:
+            self._write_index()
+        return entries
+
+    def _evict(self) -> None:
+        by_hash: dict[str, dict[str, typing.Any]] = {}
+        for record in self.index.values():
+            newest = by_hash.get(record["hash"])
+            if newest is None or newest["atime"] < record["atime"]:
+                by_hash[record["hash"]] = record
+
+        total_bytes = sum(record["bytes"] for record in by_hash.values())
+        evicted = set()
+        for content_hash, record in sorted(
+            by_hash.items(), key=lambda item: item[1]["atime"]
+        ):
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= record["bytes"]
+            evicted.add(content_hash)
+            self._entry_filename(content_hash).unlink(missing_ok=True)
+
+        if evicted:
+            self.index = {
+                key: record
+                for key, record in self.index.items()
+                if record["hash"] not in evicted
+            }
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.index = {}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--phrase_cache_dir", type=Path, default=DEFAULT_CACHE_DIR
+    )
+    parser.add_argument(
+        "--phrase_cache_max_bytes", type=int, default=DEFAULT_MAX_BYTES
+    )
+    parser.add_argument("--no_phrase_cache", action="store_true")
+    parser.add_argument("--clear_phrase_cache", action="store_true")
+
+
+def from_args(args: argparse.Namespace) -> PhraseCache | None:
+    cache = PhraseCache(args.phrase_cache_dir, args.phrase_cache_max_bytes)
+    if args.clear_phrase_cache:
+        cache.clear()
+    if args.no_phrase_cache:
+        return None
+    return cache
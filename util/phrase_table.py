@@ -0,0 +1,105 @@
+import sys
+import typing
+
+
+class PhraseTable:
+    __slots__ = ("names", "index", "columns")
+
+    def __init__(self) -> None:
+        # One row per key, shared by the text columns of every language. Keys
+        # are interned, so tables of different platforms share them as well.
+        self.names: list[str] = []
+        self.index: dict[str, int] = {}
+        self.columns: dict[str, list[str | None]] = {}
+
+    def add(
+        self,
+        column: str,
+        entries: typing.Iterable[tuple[str, str]],
+        base: str | None = None,
+    ) -> None:
+        # Texts equal to the ones of the base column reuse its objects.
+        self.columns.pop(column, None)
+        names, index = self.names, self.index
+        base_texts = self.columns[base] if base is not None else []
+        texts: list[str | None] = [None] * len(names)
+        for name, text in entries:
+            row = index.get(name)
+            if row is None:
+                name = sys.intern(name)
+                row = index[name] = len(names)
+                names.append(name)
+                texts.append(None)
+            elif row < len(base_texts) and base_texts[row] == text:
+                text = base_texts[row]
+            texts[row] = text
+        for other in self.columns.values():
+            other.extend([None] * (len(names) - len(other)))
+        self.columns[column] = texts
+
+    def remove(self, column: str) -> None:
+        del self.columns[column]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def get(self, column: str, name: str) -> str | None:
+        row = self.index.get(name)
+        if row is None:
+            return None
+        return self.columns[column][row]
+
+    def items(self, column: str) -> typing.Iterator[tuple[str, str]]:
+        for name, text in zip(self.names, self.columns[column]):
+            if text is not None:
+                yield name, text
+
+    def join(
+        self, left: str, right: str
+    ) -> typing.Iterator[tuple[str, str, str]]:
+        for name, text_left, text_right in zip(
+            self.names, self.columns[left], self.columns[right]
+        ):
+            if text_left is not None and text_right is not None:
+                yield name, text_left, text_right
+
+    def modified(
+        self, column: str, base: str
+    ) -> typing.Iterator[tuple[str, str]]:
+        for name, text, base_text in zip(
+            self.names, self.columns[column], self.columns[base]
+        ):
+            if (
+                text is not None
+                and base_text is not None
+                and text != base_text
+            ):
+                yield name, text
+
+    def overlay(
+        self, column: str, base: str, fallback: str
+    ) -> list[tuple[str, str]]:
+        # Texts of the column that differ from the base take precedence over
+        # the fallback column.
+        texts = [
+            (
+                fallback_text
+                if text is None or base_text is None or text == base_text
+                else text
+            )
+            for text, base_text, fallback_text in zip(
+                self.columns[column],
+                self.columns[base],
+                self.columns[fallback],
+            )
+        ]
+        result = [
+            (name, text)
+            for name, text in zip(self.names, texts)
+            if text is not None
+        ]
+        result.sort()
+        return result
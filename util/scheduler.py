@@ -0,0 +1,189 @@
+import asyncio
+import email.utils
+import random
+import time
+import typing
+
+from . import tracing
+
+
+T = typing.TypeVar("T")
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate: float = rate_per_minute / 60.0
+        self.capacity: float = capacity or rate_per_minute
+        self.available: float = self.capacity
+        self.updated_at: float = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                return
+            await asyncio.sleep((amount - self.available) / self.rate)
+
+
+def get_retry_after(ex: BaseException) -> float | None:
+    headers = getattr(ex, "headers", None)
+    if headers is None:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(
+            0.0,
+            email.utils.parsedate_to_datetime(value).timestamp() - time.time(),
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(ex: BaseException) -> bool:
+    status = getattr(ex, "status", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(
+        ex,
+        (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            OSError,
+        ),
+    )
+
+
+class Scheduler:
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 100,
+        max_retries: int = 6,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.requests: TokenBucket | None = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens: TokenBucket | None = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.concurrency: float = float(initial_concurrency)
+        self.min_concurrency: int = min_concurrency
+        self.max_concurrency: int = max_concurrency
+        self.max_retries: int = max_retries
+        self.base_backoff: float = base_backoff
+        self.max_backoff: float = max_backoff
+        self.active: int = 0
+        self.condition: asyncio.Condition = asyncio.Condition()
+        self.resume_at: float = 0.0
+        self.decreased_at: float = 0.0
+        self.latency: float | None = None
+        self.retries: int = 0
+        self.errors: dict[str, int] = {}
+
+    async def _acquire_slot(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.active < int(self.concurrency)
+            )
+            self.active += 1
+
+    async def _release_slot(self) -> None:
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Errors from requests that were already in flight should only
+        # shrink the window once.
+        if now - self.decreased_at < (self.latency or 1.0):
+            return
+        self.decreased_at = now
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+
+    def _on_success(self, latency: float) -> None:
+        # Only rate limits, server errors and timeouts shrink the window:
+        # latency grows with the batch size, so it says little about load.
+        self.latency = (
+            latency
+            if self.latency is None
+            else 0.8 * self.latency + 0.2 * latency
+        )
+        self.concurrency = min(
+            self.max_concurrency, self.concurrency + 1 / self.concurrency
+        )
+
+    def _backoff(self, ex: BaseException, attempt: int) -> float:
+        delay = random.uniform(
+            0, min(self.max_backoff, self.base_backoff * 2**attempt)
+        )
+        retry_after = get_retry_after(ex)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            self.resume_at = max(
+                self.resume_at, time.monotonic() + retry_after
+            )
+        return delay
+
+    async def run(
+        self,
+        operation: typing.Callable[[], typing.Awaitable[T]],
+        tokens: int = 0,
+    ) -> T:
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            await self._acquire_slot()
+            try:
+                if self.requests is not None:
+                    await self.requests.acquire(1)
+                if self.tokens is not None and tokens:
+                    await self.tokens.acquire(tokens)
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                start = time.monotonic()
+                tracing.add("queue_time", start - queued_at)
+                tracing.add("requests", 1)
+                result = await operation()
+            except Exception as ex:
+                if not is_retryable(ex) or attempt >= self.max_retries:
+                    raise
+                status = getattr(ex, "status", None)
+                name = f"HTTP {status}" if status else type(ex).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+                self.retries += 1
+                tracing.add("retries", 1)
+                self._decrease()
+                delay = self._backoff(ex, attempt)
+            else:
+                latency = time.monotonic() - start
+                tracing.add("network_time", latency)
+                self._on_success(latency)
+                return result
+            finally:
+                await self._release_slot()
+
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,146 @@
+import argparse
+import concurrent.futures
+import pathlib
+import re
+import typing
+
+from . import helpers
+
+
+Path = pathlib.Path
+
+# Entries are formatted and encoded this many at a time.
+CHUNK_ENTRIES = 512
+
+
+class Format(typing.NamedTuple):
+    suffix: str
+    header: str
+    footer: str
+    separator: str
+    entry: typing.Callable[[str, str], str]
+
+
+XML_FORMAT = Format(
+    suffix=".xml",
+    header='<?xml version="1.0" encoding="utf-8"?>\n<resources>\n',
+    footer="</resources>\n",
+    separator="",
+    entry=lambda name, text: f'  <string name="{name}">{text}</string>\n',
+)
+STRINGS_FORMAT = Format(
+    suffix=".strings",
+    header="",
+    footer="",
+    separator="\n",
+    entry=lambda name, text: f'"{name}" = "{text}";',
+)
+
+
+class Limits(typing.NamedTuple):
+    max_bytes: int | None = None
+    max_entries: int | None = None
+    workers: int = 4
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def plan_shards(
+    translation: list[tuple[str, str]], fmt: Format, limits: Limits
+) -> list[tuple[int, int]]:
+    if limits.max_bytes is None and limits.max_entries is None:
+        # Without limits the export keeps its historical two halves.
+        half = len(translation) // 2
+        return [(0, half), (half, len(translation))]
+
+    empty_size = _size(fmt.header) + _size(fmt.footer)
+    separator_size = _size(fmt.separator)
+    shards = []
+    start = 0
+    shard_size = empty_size
+    for i, (name, text) in enumerate(translation):
+        size = _size(fmt.entry(name, text))
+        if limits.max_bytes is not None:
+            if empty_size + size > limits.max_bytes:
+                raise ValueError(
+                    f"Entry {name} does not fit into {limits.max_bytes} bytes"
+                )
+            if (
+                i > start
+                and shard_size + separator_size + size > limits.max_bytes
+            ):
+                shards.append((start, i))
+                start, shard_size = i, empty_size
+        if limits.max_entries is not None and i - start >= limits.max_entries:
+            shards.append((start, i))
+            start, shard_size = i, empty_size
+        if i > start:
+            shard_size += separator_size
+        shard_size += size
+    shards.append((start, len(translation)))
+    return shards
+
+
+def write_shard(
+    filename: Path, fmt: Format, entries: list[tuple[str, str]]
+) -> None:
+    def chunks() -> typing.Iterator[bytes]:
+        yield fmt.header.encode("utf-8")
+        for start in range(0, len(entries), CHUNK_ENTRIES):
+            chunk = fmt.separator.join(
+                fmt.entry(name, text)
+                for name, text in entries[start : start + CHUNK_ENTRIES]
+            )
+            if start:
+                chunk = fmt.separator + chunk
+            yield chunk.encode("utf-8")
+        yield fmt.footer.encode("utf-8")
+
+    helpers.write_atomic(filename, chunks())
+
+
+def write_shards(
+    translation: list[tuple[str, str]],
+    fmt: Format,
+    output_dir: Path,
+    stem: str,
+    limits: Limits = Limits(),
+) -> list[Path]:
+    shards = plan_shards(translation, fmt, limits)
+    filenames = [
+        output_dir / f"{stem}_{i}{fmt.suffix}"
+        for i in range(1, len(shards) + 1)
+    ]
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(limits.workers, len(shards)))
+    ) as executor:
+        for future in [
+            executor.submit(write_shard, filename, fmt, translation[start:end])
+            for filename, (start, end) in zip(filenames, shards)
+        ]:
+            future.result()
+
+    # Shards left over from an earlier export with more shards.
+    pattern = re.compile(rf"{re.escape(stem)}_(\d+){re.escape(fmt.suffix)}")
+    for filename in output_dir.iterdir():
+        match = pattern.fullmatch(filename.name)
+        if match is not None and int(match.group(1)) > len(shards):
+            filename.unlink()
+
+    return filenames
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--max_shard_bytes", type=int, default=None)
+    parser.add_argument("--max_shard_entries", type=int, default=None)
+    parser.add_argument("--shard_workers", type=int, default=4)
+
+
+def from_args(args: argparse.Namespace) -> Limits:
+    return Limits(
+        args.max_shard_bytes, args.max_shard_entries, args.shard_workers
+    )
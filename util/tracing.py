@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import contextvars
+import json
+import pathlib
+import threading
+import time
+import typing
+
+
+Path = pathlib.Path
+
+
+class Span:
+    __slots__ = ("kind", "name", "start", "duration", "fields")
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind: str = kind
+        self.name: str = name
+        self.start: float = time.time()
+        self.duration: float = 0.0
+        self.fields: dict[str, float] = {}
+
+    def add(self, field: str, value: float) -> None:
+        self.fields[field] = self.fields.get(field, 0) + value
+
+    def to_json(self) -> dict[str, typing.Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            **{field: round(value, 6) for field, value in self.fields.items()},
+        }
+
+
+class Tracer:
+    def __init__(
+        self,
+        trace_filename: Path | None = None,
+        metrics_filename: Path | None = None,
+    ) -> None:
+        self.trace: typing.TextIO | None = None
+        if trace_filename is not None:
+            trace_filename.parent.mkdir(parents=True, exist_ok=True)
+            self.trace = open(
+                trace_filename, "a", encoding="utf-8", buffering=1
+            )
+        self.metrics_filename: Path | None = metrics_filename
+        self.lock: threading.Lock = threading.Lock()
+        self.durations: dict[str, list[float]] = {}
+        self.totals: dict[str, dict[str, float]] = {}
+
+    def record(self, span: Span) -> None:
+        with self.lock:
+            self.durations.setdefault(span.kind, []).append(span.duration)
+            totals = self.totals.setdefault(span.kind, {})
+            for field, value in span.fields.items():
+                totals[field] = totals.get(field, 0) + value
+            if self.trace is not None:
+                self.trace.write(
+                    json.dumps(span.to_json(), ensure_ascii=False) + "\n"
+                )
+
+    def total(self, kind: str, field: str) -> float:
+        return self.totals.get(kind, {}).get(field, 0)
+
+    def summary(self) -> str:
+        lines = [
+            f"{'span':<16} {'count':>7} {'total s':>9}"
+            f" {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"
+        ]
+        for kind, durations in sorted(self.durations.items()):
+            durations = sorted(durations)
+            total = sum(durations)
+            p95 = durations[int(0.95 * (len(durations) - 1))]
+            lines.append(
+                f"{kind:<16} {len(durations):>7} {total:>9.2f}"
+                f" {1000 * total / len(durations):>9.1f}"
+                f" {1000 * p95:>9.1f} {1000 * durations[-1]:>9.1f}"
+            )
+        for kind, totals in sorted(self.totals.items()):
+            if totals:
+                lines.append(
+                    f"{kind}: "
+                    + ", ".join(
+                        (
+                            f"{field} {value:.2f}"
+                            if isinstance(value, float)
+                            else f"{field} {value}"
+                        )
+                        for field, value in sorted(totals.items())
+                    )
+                )
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP translate_span_seconds Time spent in traced spans.",
+            "# TYPE translate_span_seconds summary",
+        ]
+        for kind, durations in sorted(self.durations.items()):
+            lines.append(
+                f'translate_span_seconds_count{{span="{kind}"}}'
+                f" {len(durations)}"
+            )
+            lines.append(
+                f'translate_span_seconds_sum{{span="{kind}"}}'
+                f" {sum(durations)}"
+            )
+        fields = sorted(
+            {field for totals in self.totals.values() for field in totals}
+        )
+        for field in fields:
+            lines.append(f"# TYPE translate_{field}_total counter")
+            for kind, totals in sorted(self.totals.items()):
+                if field in totals:
+                    lines.append(
+                        f'translate_{field}_total{{span="{kind}"}}'
+                        f" {totals[field]}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+        if self.metrics_filename is not None:
+            # helpers imports this module, so it is only imported when needed.
+            from . import helpers
+
+            helpers.write_atomic(
+                self.metrics_filename, self.prometheus().encode("utf-8")
+            )
+
+
+_tracer: Tracer | None = None
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def set_tracer(tracer: Tracer | None) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str) -> typing.Iterator[Span | None]:
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    current = Span(kind, name)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        tracer.record(current)
+
+
+def add(field: str, value: float) -> None:
+    current = _current_span.get()
+    if current is not None:
+        current.add(field, value)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--trace_filename", type=Path, default=None)
+    parser.add_argument("--metrics_filename", type=Path, default=None)
+
+
+def from_args(args: argparse.Namespace) -> Tracer:
+    tracer = Tracer(args.trace_filename, args.metrics_filename)
+    set_tracer(tracer)
+    return tracer
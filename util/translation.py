@@ -0,0 +1,350 @@
+import asyncio
+import re
+import time
+import typing
+
+from . import chatgpt
+from . import dictionaries
+from . import glossary
+from . import helpers
+from . import memory as memory_lib
+from . import tracing
+from . import validation as validation_lib
+
+
+class Language(typing.NamedTuple):
+    code: str
+    name: str
+    dictionary: dictionaries.Dictionary
+    memory: memory_lib.TranslationMemory | None = None
+
+
+class Batch(typing.NamedTuple):
+    tasks: list[helpers.Task]
+    prompt_template: str
+    languages: tuple[Language, ...]
+    glossary_word_boundary: bool = False
+    # Answers failing these checks are treated as missing.
+    validation: validation_lib.Limits | None = None
+
+    @property
+    def dictionary(self) -> dictionaries.Dictionary:
+        return dictionaries.merge_dictionaries(
+            tuple(language.dictionary for language in self.languages)
+        )
+
+
+class Answer(typing.NamedTuple):
+    name: str
+    # Translations keyed by the language code.
+    texts: dict[str, str]
+
+
+def format_prompt(
+    prompt_template: str,
+    languages: tuple[Language, ...],
+    example_count: int,
+    snippets: str,
+    memory: str,
+    footer: str,
+) -> str:
+    names = [language.name for language in languages]
+    return prompt_template.format(
+        language_name=" and ".join(names),
+        language_columns=" - ".join(names),
+        answer_example="\n".join(
+            f'{number}. {name}: """..."""'
+            for number in (1, 2)
+            for name in names
+        ),
+        example_count=example_count,
+        snippets=snippets,
+        memory=memory,
+        footer=footer,
+    )
+
+
+def make_prompt(batch: Batch) -> str:
+    example_strs = []
+    example_count = 0
+    dictionary = batch.dictionary
+    matcher = glossary.get_matcher(dictionary, batch.glossary_word_boundary)
+    used_snippet_ids = set()
+    for id, task in enumerate(batch.tasks):
+        used_snippet_ids |= matcher.match_ids(task.text_en, task.text_ru)
+        example_strs.append(f"{id+1}.")
+        example_strs.append(f'"""{task.text_en}"""')
+        example_strs.append(f'"""{task.text_ru}"""')
+        example_strs.append("")
+        example_count += 1
+    used_snippets = [
+        dictionary.snippets[snippet_id]
+        for snippet_id in sorted(used_snippet_ids)
+    ]
+    if not used_snippets:
+        used_snippets = dictionary.snippets[:5]
+    tracing.add("snippets", len(used_snippets))
+
+    memory_strs = []
+    for language in batch.languages:
+        if language.memory is None:
+            continue
+        examples = []
+        for task in batch.tasks:
+            for match in language.memory.search(task):
+                if match.entry not in examples:
+                    examples.append(match.entry)
+        examples = examples[: memory_lib.MAX_BATCH_EXAMPLES]
+        tracing.add("memory_examples", len(examples))
+        memory_strs.append(memory_lib.format_memory(examples, language.name))
+
+    footer = "\n".join(example_strs)
+    return format_prompt(
+        batch.prompt_template,
+        batch.languages,
+        example_count,
+        helpers.format_snippets(used_snippets),
+        "".join(memory_strs),
+        footer,
+    )
+
+
+# The closing quotes are the last of a run, so an answer ending with an
+# escaped quote keeps it.
+ANSWER = re.compile(r'(?:^|\n)\s*(\d+)\.\s*"""(.*?)"""(?!")', re.DOTALL)
+# With several languages every answer line names its language.
+LABELED_ANSWER = re.compile(
+    r'(?:^|\n)\s*(\d+)\.\s*([^\W\d][^\n":]*):\s*"""(.*?)"""(?!")',
+    re.DOTALL,
+)
+
+
+def find_answers(
+    batch: Batch, resp: str, position: int = 0
+) -> typing.Iterator[tuple[int, int, int, str]]:
+    # Yields the end of every answer, its task and language indices and text.
+    if len(batch.languages) == 1:
+        for match in ANSWER.finditer(resp, position):
+            yield match.end(), int(match.group(1)) - 1, 0, match.group(2)
+        return
+
+    language_indices = {
+        language.name.lower(): i for i, language in enumerate(batch.languages)
+    }
+    for match in LABELED_ANSWER.finditer(resp, position):
+        language_index = language_indices.get(match.group(2).strip().lower())
+        if language_index is not None:
+            yield (
+                match.end(),
+                int(match.group(1)) - 1,
+                language_index,
+                match.group(3),
+            )
+
+
+def parse_answers(batch: Batch, resp: str) -> dict[tuple[int, int], str]:
+    answers = {}
+    duplicates = set()
+    for _, index, language_index, text in find_answers(batch, resp):
+        if not 0 <= index < len(batch.tasks):
+            continue
+        key = (index, language_index)
+        if key in answers:
+            duplicates.add(key)
+        answers[key] = text
+    for key in duplicates:
+        del answers[key]
+
+    return answers
+
+
+def is_valid_answer(batch: Batch, task: helpers.Task, text: str) -> bool:
+    if not text.strip():
+        return not task.text_ru.strip()
+    return batch.validation is None or not validation_lib.check(
+        task, text, batch.validation
+    )
+
+
+def make_answer(
+    batch: Batch, index: int, texts: dict[int, str]
+) -> Answer | None:
+    # A task is answered only when every language of the batch is.
+    task = batch.tasks[index]
+    if len(texts) < len(batch.languages) or not all(
+        is_valid_answer(batch, task, text) for text in texts.values()
+    ):
+        return None
+    return Answer(
+        task.name,
+        {
+            language.code: texts[i]
+            for i, language in enumerate(batch.languages)
+        },
+    )
+
+
+def parse_response(batch: Batch, resp: str) -> list[Answer]:
+    texts_by_index: dict[int, dict[int, str]] = {}
+    for (index, language_index), text in parse_answers(batch, resp).items():
+        texts_by_index.setdefault(index, {})[language_index] = text
+
+    result = []
+    rejected = 0
+    for i in range(len(batch.tasks)):
+        texts = texts_by_index.get(i, {})
+        answer = make_answer(batch, i, texts)
+        if answer is not None:
+            result.append(answer)
+        elif len(texts) == len(batch.languages):
+            rejected += 1
+    if rejected:
+        tracing.add("rejected", rejected)
+
+    return result
+
+
+class AnswerStream:
+    def __init__(self, batch: Batch) -> None:
+        self.batch: Batch = batch
+        self.position: int = 0
+        self.texts: dict[int, dict[int, str]] = {}
+        self.answered: set[int] = set()
+
+    def feed(self, content: str) -> list[Answer]:
+        if len(content) < self.position:
+            # The request was retried and the answer started over.
+            self.position = 0
+            self.texts = {}
+        result = []
+        for end, index, language_index, text in find_answers(
+            self.batch, content, self.position
+        ):
+            if end == len(content):
+                # The closing quotes may go on in the next chunk; the answer
+                # at the very end is left to the parse of the whole response.
+                break
+            self.position = end
+            if (
+                not 0 <= index < len(self.batch.tasks)
+                or index in self.answered
+            ):
+                continue
+            texts = self.texts.setdefault(index, {})
+            if language_index in texts or not is_valid_answer(
+                self.batch, self.batch.tasks[index], text
+            ):
+                continue
+            texts[language_index] = text
+            answer = make_answer(self.batch, index, texts)
+            if answer is not None:
+                self.answered.add(index)
+                result.append(answer)
+        return result
+
+
+def _parse_traced(batch: Batch, resp: str) -> list[Answer]:
+    start = time.perf_counter()
+    result = parse_response(batch, resp)
+    tracing.add("parse_time", time.perf_counter() - start)
+    tracing.add("items", len(batch.tasks))
+    tracing.add("answered", len(result))
+    return result
+
+
+def process_batch(
+    batch: Batch, chatgpt_client: chatgpt.ChatGpt
+) -> list[Answer]:
+    with tracing.span("batch", batch.tasks[0].name):
+        prompt = make_prompt(batch)
+        resp = chatgpt_client.get_response(prompt)
+        result = _parse_traced(batch, resp)
+    if not result:
+        chatgpt_client.forget(prompt)
+    return result
+
+
+async def process_batch_async(
+    batch: Batch, chatgpt_client: chatgpt.AsyncChatGpt
+) -> list[Answer]:
+    with tracing.span("batch", batch.tasks[0].name):
+        prompt = make_prompt(batch)
+        resp = await chatgpt_client.get_response_async(prompt)
+        result = _parse_traced(batch, resp)
+    if not result:
+        chatgpt_client.forget(prompt)
+    return result
+
+
+async def process_batch_streaming(
+    batch: Batch,
+    chatgpt_client: chatgpt.AsyncChatGpt,
+    on_answers: typing.Callable[[list[Answer]], None],
+) -> list[Answer]:
+    stream = AnswerStream(batch)
+    committed = set()
+
+    def commit(answers: list[Answer]) -> None:
+        if not answers:
+            return
+        if not committed:
+            tracing.add("first_answer_time", time.perf_counter() - start)
+        committed.update(answer.name for answer in answers)
+        on_answers(answers)
+
+    with tracing.span("batch", batch.tasks[0].name):
+        start = time.perf_counter()
+        prompt = make_prompt(batch)
+        resp = await chatgpt_client.stream_response_async(
+            prompt, lambda content: commit(stream.feed(content))
+        )
+        result = _parse_traced(batch, resp)
+        commit([answer for answer in result if answer.name not in committed])
+    if not result:
+        chatgpt_client.forget(prompt)
+    return result
+
+
+async def translate_batch_async(
+    batch: Batch,
+    chatgpt_client: chatgpt.AsyncChatGpt,
+    on_answers: typing.Callable[[list[Answer]], None] | None = None,
+) -> list[Answer]:
+    if on_answers is None:
+        result = await process_batch_async(batch, chatgpt_client)
+    else:
+        result = await process_batch_streaming(
+            batch, chatgpt_client, on_answers
+        )
+    answered = {answer.name for answer in result}
+    missing = [task for task in batch.tasks if task.name not in answered]
+    if not missing:
+        return result
+
+    print(
+        f"Incomplete response: {len(result)} of {len(batch.tasks)} answers,"
+        f" re-queueing {len(missing)} tasks"
+    )
+    if result:
+        return result + await translate_batch_async(
+            batch._replace(tasks=missing), chatgpt_client, on_answers
+        )
+
+    if len(batch.tasks) == 1:
+        print(f"Giving up on task: {batch.tasks[0].name}")
+        return result
+
+    half = len(batch.tasks) // 2
+    parts = await asyncio.gather(
+        translate_batch_async(
+            batch._replace(tasks=batch.tasks[:half]),
+            chatgpt_client,
+            on_answers,
+        ),
+        translate_batch_async(
+            batch._replace(tasks=batch.tasks[half:]),
+            chatgpt_client,
+            on_answers,
+        ),
+    )
+    return [answer for part in parts for answer in part]
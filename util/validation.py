@@ -0,0 +1,239 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import pathlib
+import re
+import typing
+
+from . import clustering
+from . import helpers
+from . import phrase_cache
+
+
+Path = pathlib.Path
+
+# Tags are compared by name only, so a translated link title or attribute
+# order does not matter.
+MARKUP = re.compile(r"<(/?[A-Za-z][\w-]*)[^<>]*>|\*\*|__|~~|`")
+ESCAPE = re.compile(r"\\[nrt\"'\\]|\n")
+CHECKS = ("placeholders", "markup", "escapes", "length")
+
+
+class Limits(typing.NamedTuple):
+    min_length_ratio: float = 0.3
+    max_length_ratio: float = 3.0
+    # Shorter sources like "OK" or "Mute" are not checked for length.
+    min_source_length: int = 20
+
+
+class Issue(typing.NamedTuple):
+    language_code: str
+    platform: str
+    name: str
+    checks: list[str]
+    text_en: str
+    text_ru: str
+    text: str
+
+
+class Report(typing.NamedTuple):
+    checked: int
+    issues: list[Issue]
+
+    def failing(self) -> dict[tuple[str, str], set[str]]:
+        result: dict[tuple[str, str], set[str]] = {}
+        for issue in self.issues:
+            result.setdefault(
+                (issue.language_code, issue.platform), set()
+            ).add(issue.name)
+        return result
+
+    def to_json(self) -> dict[str, typing.Any]:
+        return {
+            "checked": self.checked,
+            "failed": len(self.issues),
+            "checks": {
+                check: sum(check in issue.checks for issue in self.issues)
+                for check in CHECKS
+            },
+            "issues": [issue._asdict() for issue in self.issues],
+        }
+
+
+class Job(typing.NamedTuple):
+    platform: str
+    defaults_dir: Path
+    snapshots_dir: Path
+    language_codes: list[str]
+    cache: phrase_cache.PhraseCache | None
+    limits: Limits
+
+
+def _placeholders(text: str) -> collections.Counter:
+    return collections.Counter(clustering.PLACEHOLDER.findall(text))
+
+
+def _markup(text: str) -> collections.Counter:
+    return collections.Counter(
+        match.group(1).lower() if match.group(1) else match.group(0)
+        for match in MARKUP.finditer(text)
+    )
+
+
+def _escapes(text: str) -> collections.Counter:
+    return collections.Counter(ESCAPE.findall(text))
+
+
+PARITY_CHECKS = (
+    ("placeholders", _placeholders),
+    ("markup", _markup),
+    ("escapes", _escapes),
+)
+
+
+def check(
+    task: helpers.Task, text: str, limits: Limits = Limits()
+) -> list[str]:
+    failed = []
+    for name, count in PARITY_CHECKS:
+        found = count(text)
+        # The English and Russian source differ now and then, e.g. in the
+        # quotes, so matching either of them is enough.
+        if found != count(task.text_ru) and found != count(task.text_en):
+            failed.append(name)
+    if len(task.text_ru) >= limits.min_source_length and not (
+        limits.min_length_ratio
+        <= len(text) / len(task.text_ru)
+        <= limits.max_length_ratio
+    ):
+        failed.append("length")
+    return failed
+
+
+def validate_phrases(
+    language_code: str,
+    platform: str,
+    tasks: list[helpers.Task],
+    phrases: dict[str, str],
+    limits: Limits = Limits(),
+) -> Report:
+    checked = 0
+    issues = []
+    for task in tasks:
+        text = phrases.get(task.name)
+        if text is None or not task.text_en.strip():
+            continue
+        checked += 1
+        failed = check(task, text, limits)
+        if failed:
+            issues.append(
+                Issue(
+                    language_code,
+                    platform,
+                    task.name,
+                    failed,
+                    task.text_en,
+                    task.text_ru,
+                    text,
+                )
+            )
+    return Report(checked, issues)
+
+
+def merge_reports(reports: list[Report]) -> Report:
+    return Report(
+        sum(report.checked for report in reports),
+        [issue for report in reports for issue in report.issues],
+    )
+
+
+def validate_platform(job: Job) -> Report:
+    tasks = helpers.load_tasks(job.defaults_dir, job.platform, job.cache)
+    reports = []
+    for language_code in job.language_codes:
+        filename = (
+            job.snapshots_dir / language_code / job.platform
+        ).with_suffix(".json")
+        if not filename.exists():
+            continue
+        snapshot = helpers.Snapshot(
+            job.snapshots_dir, language_code, job.platform
+        )
+        reports.append(
+            validate_phrases(
+                language_code,
+                job.platform,
+                tasks,
+                snapshot.phrases,
+                job.limits,
+            )
+        )
+    return merge_reports(reports)
+
+
+def validate_snapshots(
+    defaults_dir: Path,
+    snapshots_dir: Path,
+    language_codes: list[str],
+    platforms: list[str],
+    cache: phrase_cache.PhraseCache | None = None,
+    limits: Limits = Limits(),
+    jobs: int = 1,
+) -> Report:
+    validation_jobs = [
+        Job(
+            platform,
+            defaults_dir,
+            snapshots_dir,
+            language_codes,
+            cache,
+            limits,
+        )
+        for platform in platforms
+    ]
+    if len(validation_jobs) > 1 and jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(validation_jobs))
+        ) as executor:
+            reports = list(executor.map(validate_platform, validation_jobs))
+    else:
+        reports = [validate_platform(job) for job in validation_jobs]
+    return merge_reports(reports)
+
+
+def format_summary(report: Report) -> str:
+    counts = report.to_json()["checks"]
+    return (
+        f"Validation: {report.checked} translations checked,"
+        f" {len(report.issues)} failed ("
+        + ", ".join(f"{check} {counts[check]}" for check in CHECKS)
+        + ")"
+    )
+
+
+def write_report(report: Report, filename: Path) -> None:
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    with open(filename, "wb") as output:
+        output.write(
+            json.dumps(report.to_json(), indent=2, ensure_ascii=False).encode(
+                "utf-8"
+            )
+        )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--validate", action="store_true")
+    parser.add_argument("--validation_report", type=Path, default=None)
+    parser.add_argument(
+        "--min_length_ratio", type=float, default=Limits().min_length_ratio
+    )
+    parser.add_argument(
+        "--max_length_ratio", type=float, default=Limits().max_length_ratio
+    )
+
+
+def from_args(args: argparse.Namespace) -> Limits | None:
+    if not args.validate:
+        return None
+    return Limits(args.min_length_ratio, args.max_length_ratio)
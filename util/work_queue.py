@@ -0,0 +1,194 @@
+import collections
+import heapq
+import json
+import os
+import pathlib
+import threading
+import typing
+
+from . import helpers
+
+
+Path = pathlib.Path
+
+DEFAULT_COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+
+class Item(typing.NamedTuple):
+    language_code: str
+    platform: str
+    name: str
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        filename: Path,
+        compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+    ) -> None:
+        # Every change is appended to a log of (item, priority) records, a
+        # null priority marks a finished item. Lower priorities go first.
+        self.filename: Path = filename
+        self.compact_threshold: int = compact_threshold
+        self.lock: threading.Lock = threading.Lock()
+        self.ready: threading.Condition = threading.Condition(self.lock)
+        self.heap: list[tuple[int, int, Item]] = []
+        self.priorities: dict[Item, int] = {}
+        # Taken items, True when they were queued again while being worked.
+        self.taken: dict[Item, bool] = {}
+        self.counter: int = 0
+        self.size: int = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            source = open(self.filename, "rb")
+        except FileNotFoundError:
+            return
+        with source:
+            for line in source:
+                self.size += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                item = Item(*record["item"])
+                if record["priority"] is None:
+                    self.priorities.pop(item, None)
+                else:
+                    self.priorities[item] = record["priority"]
+        for item, priority in self.priorities.items():
+            self._push(item, priority)
+
+    def _push(self, item: Item, priority: int) -> None:
+        heapq.heappush(self.heap, (priority, self.counter, item))
+        self.counter += 1
+
+    @staticmethod
+    def _encode(item: Item, priority: int | None) -> bytes:
+        return (
+            json.dumps(
+                {"item": list(item), "priority": priority}, ensure_ascii=False
+            ).encode("utf-8")
+            + b"\n"
+        )
+
+    def _append(self, records: list[tuple[Item, int | None]]) -> None:
+        data = b"".join(
+            self._encode(item, priority) for item, priority in records
+        )
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filename, "ab") as output:
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+        self.size += len(data)
+        if self.size > self.compact_threshold:
+            self._compact()
+
+    def _compact(self) -> None:
+        data = b"".join(
+            self._encode(item, priority)
+            for item, priority in self.priorities.items()
+        )
+        helpers.write_atomic(self.filename, data)
+        self.size = len(data)
+
+    def _has_ready(self) -> bool:
+        # Drops heap entries superseded by a later priority change.
+        while self.heap:
+            priority, _, item = self.heap[0]
+            if (
+                self.priorities.get(item) == priority
+                and item not in self.taken
+            ):
+                return True
+            heapq.heappop(self.heap)
+        return False
+
+    def put(self, items: typing.Iterable[Item], priority: int = 0) -> int:
+        records = []
+        with self.lock:
+            for item in items:
+                current = self.priorities.get(item)
+                if item in self.taken:
+                    self.taken[item] = True
+                elif current is not None and current <= priority:
+                    continue
+                if current is None or priority < current:
+                    self.priorities[item] = priority
+                    records.append((item, priority))
+                if item not in self.taken:
+                    self._push(item, priority)
+            if records:
+                self._append(records)
+                self.ready.notify_all()
+        return len(records)
+
+    def take(self, max_items: int, timeout: float | None = None) -> list[Item]:
+        # Takes up to max_items of the most urgent items of one language.
+        with self.ready:
+            if not self.ready.wait_for(self._has_ready, timeout):
+                return []
+            items = []
+            skipped = []
+            while (
+                self._has_ready()
+                and len(items) < max_items
+                and len(skipped) < 4 * max_items
+            ):
+                priority, _, item = heapq.heappop(self.heap)
+                if items and item.language_code != items[0].language_code:
+                    skipped.append((item, priority))
+                    continue
+                items.append(item)
+                self.taken[item] = False
+            for item, priority in skipped:
+                self._push(item, priority)
+            return items
+
+    def done(self, items: typing.Iterable[Item]) -> None:
+        records = []
+        with self.lock:
+            for item in items:
+                if self.taken.pop(item, False):
+                    # Queued again while being worked, e.g. its source changed.
+                    self._push(item, self.priorities[item])
+                    continue
+                if self.priorities.pop(item, None) is not None:
+                    records.append((item, None))
+            if records:
+                self._append(records)
+            self.ready.notify_all()
+
+    def release(self, items: typing.Iterable[Item], priority: int) -> None:
+        records = []
+        with self.lock:
+            for item in items:
+                self.taken.pop(item, None)
+                current = self.priorities.get(item)
+                if current is None:
+                    continue
+                if current != priority:
+                    self.priorities[item] = priority
+                    records.append((item, priority))
+                self._push(item, priority)
+            if records:
+                self._append(records)
+            self.ready.notify_all()
+
+    def priority(self, item: Item) -> int | None:
+        with self.lock:
+            return self.priorities.get(item)
+
+    def counts(self) -> dict[str, typing.Any]:
+        with self.lock:
+            return {
+                "pending": len(self.priorities) - len(self.taken),
+                "in_progress": len(self.taken),
+                "languages": dict(
+                    collections.Counter(
+                        item.language_code for item in self.priorities
+                    )
+                ),
+            }